@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+
+import torch
+import torchvision.datasets as datasets
+import torchvision.transforms as transforms
+
+# Shared pieces for the ml_training tools (distillation, comparison reports, ...).
+# Mirrors the configuration and dataset handling of train.ipynb, and loads models
+# through the serving API's load_model so every checkpoint written here is servable.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "model_api"))
+from app.loader import build_head, build_model, load_model, residual_blocks  # noqa: E402,F401
+
+# Configuration (same as train.ipynb)
+DATA_ROOT = "/kaggle/input/skindiseasedataset/SkinDisease/SkinDisease"
+SELECTED_CLASSES = ['Acne', 'Eczema', 'Psoriasis', 'Warts', 'SkinCancer', 'Unknown_Normal']
+BATCH_SIZE = 32
+NUM_WORKERS = 2
+
+train_transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.RandomHorizontalFlip(),
+    transforms.RandomRotation(10),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406],
+                         [0.229, 0.224, 0.225])
+])
+
+test_transform = transforms.Compose([
+    transforms.Resize((224, 224)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406],
+                         [0.229, 0.224, 0.225])
+])
+
+
+# ImageFolder restricted to SELECTED_CLASSES and relabelled in that order
+def load_split(data_root: str, split: str, transform):
+    data = datasets.ImageFolder(os.path.join(data_root, split), transform=transform)
+    selected_idx = {
+        data.class_to_idx[cls]: cls
+        for cls in SELECTED_CLASSES
+        if cls in data.class_to_idx
+    }
+    assert len(selected_idx) > 0, "No selected classes found in dataset!"
+
+    data.samples = [
+        (path, SELECTED_CLASSES.index(selected_idx[label]))
+        for path, label in data.samples
+        if label in selected_idx
+    ]
+    data.targets = [label for _, label in data.samples]
+    data.classes = SELECTED_CLASSES
+    data.class_to_idx = {cls: i for i, cls in enumerate(SELECTED_CLASSES)}
+    return data
+
+
+def make_loader(dataset, shuffle: bool, batch_size: int = BATCH_SIZE):
+    return torch.utils.data.DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=NUM_WORKERS,
+        pin_memory=True
+    )
+
+
+# Write a self-describing checkpoint that load_model understands
+# (config: extra build_model arguments needed to rebuild the architecture)
+def save_checkpoint(model, arch: str, path: str, config=None, **extra):
+    checkpoint = {
+        "arch": arch,
+        "num_classes": len(SELECTED_CLASSES),
+        "config": config or {},
+        "state_dict": model.state_dict(),
+    }
+    checkpoint.update(extra)
+    torch.save(checkpoint, path)
+
+
+# Logits for every sample of a loader, in loader order, plus the labels
+def collect_logits(model, loader, device):
+    model.eval()
+    all_logits = []
+    all_labels = []
+    with torch.no_grad():
+        for batch in loader:
+            images, labels = batch[0], batch[1]
+            all_logits.append(model(images.to(device)).float().cpu())
+            all_labels.append(labels)
+    return torch.cat(all_logits), torch.cat(all_labels)
+
+
+# Top-1 accuracy (%) on a loader
+def evaluate(model, loader, device) -> float:
+    logits, labels = collect_logits(model, loader, device)
+    return 100.0 * (logits.argmax(dim=1) == labels).float().mean().item()
+
+
+# Median single-image CPU latency in milliseconds
+def measure_latency(model, image_size: int = 224, batch_size: int = 1, repeats: int = 30) -> float:
+    model = model.cpu().eval()
+    batch = torch.randn(batch_size, 3, image_size, image_size)
+    timings = []
+    with torch.no_grad():
+        for _ in range(5):
+            model(batch)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(batch)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000 / batch_size
+
+
+def count_parameters(model) -> int:
+    return sum(p.numel() for p in model.parameters())
@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+
+import torch
+
+from common import (
+    DATA_ROOT, count_parameters, evaluate, load_model, load_split, make_loader,
+    measure_latency, test_transform,
+)
+
+# Latency-versus-accuracy report for servable checkpoints.
+# The first model is the baseline the others are compared against.
+#
+#   python compare_models.py outputs/skin_disease_resnet18.pth outputs/skin_disease_mobilenet_v3_small.pth
+
+
+def compare(paths, data_root: str, threads: int, device):
+    torch.set_num_threads(threads)
+    test_loader = make_loader(load_split(data_root, "test", test_transform), shuffle=False) if data_root else None
+
+    rows = []
+    for path in paths:
+        model = load_model(path)
+        row = {
+            "model": os.path.basename(path),
+            "parameters": count_parameters(model),
+            "size_mb": round(os.path.getsize(path) / 2 ** 20, 2),
+            "latency_ms": round(measure_latency(model), 2),
+            "accuracy": None,
+        }
+        if test_loader is not None:
+            row["accuracy"] = round(evaluate(model.to(device), test_loader, device), 2)
+        rows.append(row)
+
+    baseline = rows[0]
+    for row in rows:
+        row["speedup"] = round(baseline["latency_ms"] / row["latency_ms"], 2)
+        if row["accuracy"] is not None and baseline["accuracy"] is not None:
+            row["accuracy_delta"] = round(row["accuracy"] - baseline["accuracy"], 2)
+    return rows
+
+
+def to_markdown(rows, threads: int) -> str:
+    lines = [
+        f"CPU latency: batch 1, 224x224, {threads} thread(s), median of 30 runs.",
+        "",
+        "| Model | Params | Size (MB) | Latency (ms) | Speedup | Test acc (%) | Δ acc |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for row in rows:
+        accuracy = "n/a" if row["accuracy"] is None else f"{row['accuracy']:.2f}"
+        delta = f"{row['accuracy_delta']:+.2f}" if "accuracy_delta" in row else "n/a"
+        lines.append(
+            f"| {row['model']} | {row['parameters'] / 1e6:.2f}M | {row['size_mb']} | "
+            f"{row['latency_ms']} | {row['speedup']}x | {accuracy} | {delta} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare checkpoints on CPU latency and test accuracy")
+    parser.add_argument("models", nargs="+", help="Checkpoints; the first is the baseline")
+    parser.add_argument("--data-root", default=DATA_ROOT, help="Pass '' to skip accuracy")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--output", default="./outputs/model_comparison.md")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    rows = compare(args.models, args.data_root, args.threads, device)
+    report = to_markdown(rows, args.threads)
+    print(report)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        f.write(report)
+    with open(os.path.splitext(args.output)[0] + ".json", "w") as f:
+        json.dump(rows, f, indent=2)
+    print(f"✅ Report saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import copy
+import hashlib
+import os
+import time
+
+import torch
+import torch.nn.functional as F
+import torch.optim as optim
+from tqdm import tqdm
+
+from common import (
+    DATA_ROOT, SELECTED_CLASSES, build_model, collect_logits, evaluate, load_model,
+    load_split, make_loader, save_checkpoint, test_transform, train_transform,
+)
+
+# Knowledge distillation: train a small student (mobilenet_v3_small / resnet_lite,
+# random init, no downloads) against the soft targets of the ResNet18 checkpoint.
+# Teacher logits are computed once on the un-augmented training images and cached
+# on disk, so each student epoch costs only the student's forward/backward pass.
+#
+#   python distill.py --teacher outputs/skin_disease_resnet18.pth --arch mobilenet_v3_small
+
+
+# Wraps a dataset so every sample also carries its index (to look up cached logits)
+class IndexedDataset(torch.utils.data.Dataset):
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        image, label = self.dataset[index]
+        return image, label, index
+
+
+# Identifies the exact sample list a logits cache was computed for
+def samples_fingerprint(dataset) -> str:
+    digest = hashlib.sha256()
+    for path, label in dataset.samples:
+        digest.update(f"{path}\t{label}\n".encode())
+    return digest.hexdigest()
+
+
+# Identifies the teacher weights (the notebook retrains the teacher on every run)
+def model_fingerprint(model) -> str:
+    digest = hashlib.sha256()
+    for name, tensor in model.state_dict().items():
+        digest.update(f"{name}\t{tensor.dtype}\t{tuple(tensor.shape)}\n".encode())
+        digest.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+# Teacher logits for every training sample, computed once and cached on disk.
+# The cache is reused only for the same samples and the same teacher weights.
+def cache_teacher_logits(teacher, train_data, cache_path: str, device):
+    fingerprint = samples_fingerprint(train_data) + ":" + model_fingerprint(teacher)
+    if os.path.exists(cache_path):
+        cached = torch.load(cache_path)
+        if cached.get("fingerprint") == fingerprint:
+            print(f"Using cached teacher logits: {cache_path}")
+            return cached["logits"].float()
+        print("Teacher logits cache is stale, recomputing")
+
+    # Teacher sees the same images without augmentation
+    clean_view = copy.copy(train_data)
+    clean_view.transform = test_transform
+
+    start = time.time()
+    logits, _ = collect_logits(teacher.to(device), make_loader(clean_view, shuffle=False), device)
+    torch.save({"fingerprint": fingerprint, "logits": logits.half()}, cache_path)
+    print(f"Cached teacher logits for {len(logits)} images in {time.time() - start:.1f} sec")
+    return logits
+
+
+# Hinton et al. loss: softened KL to the teacher plus hard-label cross entropy
+def distillation_loss(student_logits, teacher_logits, labels, temperature: float, alpha: float):
+    soft = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction="batchmean",
+    ) * (temperature ** 2)
+    hard = F.cross_entropy(student_logits, labels)
+    return alpha * soft + (1 - alpha) * hard
+
+
+def train_student(student, train_data, teacher_logits, device, epochs: int = 10,
+                  learning_rate: float = 1e-3, temperature: float = 4.0, alpha: float = 0.7):
+    loader = make_loader(IndexedDataset(train_data), shuffle=True)
+    student = student.to(device)
+    optimizer = optim.Adam(student.parameters(), lr=learning_rate)
+
+    for epoch in range(epochs):
+        student.train()
+        running_loss = 0.0
+        correct = 0
+        total = 0
+        epoch_start = time.time()
+
+        for images, labels, indices in tqdm(loader, desc=f"Distilling {epoch + 1}/{epochs}", leave=False):
+            images = images.to(device)
+            labels = labels.to(device)
+            targets = teacher_logits[indices].to(device)
+
+            optimizer.zero_grad()
+            outputs = student(images)
+            loss = distillation_loss(outputs, targets, labels, temperature, alpha)
+            loss.backward()
+            optimizer.step()
+
+            running_loss += loss.item()
+            total += labels.size(0)
+            correct += (outputs.argmax(dim=1) == labels).sum().item()
+
+        print(f"Epoch [{epoch + 1}/{epochs}] Loss: {running_loss / max(1, len(loader)):.4f} | "
+              f"Train Accuracy: {100.0 * correct / max(1, total):.2f}% | "
+              f"{time.time() - epoch_start:.2f} sec")
+    return student
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distil the ResNet18 checkpoint into a smaller student")
+    parser.add_argument("--teacher", required=True, help="Teacher checkpoint (train.ipynb output)")
+    parser.add_argument("--arch", default="mobilenet_v3_small", choices=["mobilenet_v3_small", "resnet_lite"])
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--temperature", type=float, default=4.0)
+    parser.add_argument("--alpha", type=float, default=0.7, help="Weight of the distillation term")
+    parser.add_argument("--logits-cache", default="./outputs/teacher_logits.pt")
+    parser.add_argument("--output", default=None, help="Defaults to ./outputs/skin_disease_<arch>.pth")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    output = args.output or f"./outputs/skin_disease_{args.arch}.pth"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    os.makedirs(os.path.dirname(args.logits_cache) or ".", exist_ok=True)
+
+    train_data = load_split(args.data_root, "train", train_transform)
+    test_data = load_split(args.data_root, "test", test_transform)
+
+    teacher = load_model(args.teacher)
+    teacher_logits = cache_teacher_logits(teacher, train_data, args.logits_cache, device)
+
+    student = build_model(args.arch, len(SELECTED_CLASSES))
+    student = train_student(student, train_data, teacher_logits, device, args.epochs,
+                            args.lr, args.temperature, args.alpha)
+    save_checkpoint(student, args.arch, output, teacher=os.path.basename(args.teacher))
+    print(f"✅ Student saved to: {output}")
+
+    test_loader = make_loader(test_data, shuffle=False)
+    print(f"Student test accuracy: {evaluate(student, test_loader, device):.2f}%")
+
+
+if __name__ == "__main__":
+    main()
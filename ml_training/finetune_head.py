@@ -0,0 +1,221 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from PIL import Image
+
+from common import DATA_ROOT, SELECTED_CLASSES, build_head, load_model, test_transform
+
+# Head-only fine-tuning on cached frozen-backbone features.
+# The ResNet18 backbone runs once per image; its 512-d pooled features are stored
+# in a memory-mapped feature store keyed by the SHA-256 of the image file and tied
+# to the SHA-256 of the backbone checkpoint, so new clinic data or a new class only
+# costs feature extraction for the new images.
+# Only the classifier head ("fc", or a small "mlp") is trained, in seconds, and
+# the API swaps it in with HEAD_PATH (plus LABELS_PATH for a new class list).
+#
+#   python finetune_head.py --backbone outputs/skin_disease_resnet18.pth --classes Acne Eczema ... NewClass
+
+FEATURE_DIM = 512
+
+
+# Append-only store of float32 feature rows (features.f32) with a hash -> row index.
+# Features are only valid for the backbone that produced them: meta.json records its
+# content hash, and a store built by another backbone (or of unknown origin) is
+# emptied and re-extracted.
+class FeatureStore:
+    def __init__(self, directory: str, backbone: str, dim: int = FEATURE_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.data_path = os.path.join(directory, "features.f32")
+        self.index_path = os.path.join(directory, "index.json")
+        self.meta_path = os.path.join(directory, "meta.json")
+        os.makedirs(directory, exist_ok=True)
+        meta = {"backbone": backbone, "dim": dim}
+        stored = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                stored = json.load(f)
+        if stored != meta:
+            if os.path.exists(self.index_path) or os.path.exists(self.data_path):
+                print(f"Feature store {directory} was built by another backbone, rebuilding")
+            for path in (self.index_path, self.data_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            with open(self.meta_path, "w") as f:
+                json.dump(meta, f)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    # Complete rows in the data file (it may hold rows an interrupted run never indexed)
+    def row_count(self) -> int:
+        if not os.path.exists(self.data_path):
+            return 0
+        return os.path.getsize(self.data_path) // (4 * self.dim)
+
+    # Append rows for new keys; the index is rewritten only after the data is on disk
+    def append(self, keys: list, features: np.ndarray):
+        start = self.row_count()
+        with open(self.data_path, "ab") as f:
+            f.truncate(start * 4 * self.dim)  # drop a torn partial row, if any
+            f.write(np.ascontiguousarray(features, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        for offset, key in enumerate(keys):
+            self.index[key] = start + offset
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    # Read-only memory map over every stored row
+    def matrix(self) -> np.ndarray:
+        rows = self.row_count()
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self.data_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def rows(self, keys: list) -> np.ndarray:
+        return np.asarray(self.matrix()[[self.index[key] for key in keys]])
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Image paths and labels for the given classes under <data_root>/<split>/<class>/
+def list_samples(data_root: str, split: str, classes: list):
+    samples = []
+    for label, cls in enumerate(classes):
+        folder = os.path.join(data_root, split, cls)
+        if not os.path.isdir(folder):
+            print(f"Warning: no folder for class {cls} in {split}")
+            continue
+        for name in sorted(os.listdir(folder)):
+            samples.append((os.path.join(folder, name), label))
+    return samples
+
+
+# Pooled 512-d features for every sample not yet in the store (incremental)
+def extract_missing(backbone, samples, store: FeatureStore, device, batch_size: int = 64):
+    keys = [file_hash(path) for path, _ in samples]
+    missing = {}
+    for (path, _), key in zip(samples, keys):
+        if key not in store and key not in missing:
+            missing[key] = path
+    print(f"{len(samples)} images, {len(samples) - len(missing)} cached, {len(missing)} to extract")
+
+    backbone = backbone.to(device).eval()
+    pending = list(missing.items())
+    start = time.time()
+    for i in range(0, len(pending), batch_size):
+        chunk = pending[i:i + batch_size]
+        images = torch.stack([test_transform(Image.open(path).convert("RGB")) for _, path in chunk])
+        with torch.no_grad():
+            features = backbone(images.to(device)).cpu().numpy()
+        store.append([key for key, _ in chunk], features)
+    if pending:
+        print(f"Extracted {len(pending)} feature vectors in {time.time() - start:.1f} sec")
+    return keys
+
+
+def train_head(head, features: torch.Tensor, labels: torch.Tensor, epochs: int, learning_rate: float,
+               batch_size: int = 256):
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(head.parameters(), lr=learning_rate)
+    for epoch in range(epochs):
+        head.train()
+        order = torch.randperm(len(features))
+        running_loss = 0.0
+        for i in range(0, len(order), batch_size):
+            batch = order[i:i + batch_size]
+            optimizer.zero_grad()
+            loss = criterion(head(features[batch]), labels[batch])
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * len(batch)
+        if (epoch + 1) % 10 == 0 or epoch == epochs - 1:
+            print(f"Epoch [{epoch + 1}/{epochs}] Loss: {running_loss / len(features):.4f}")
+    return head.eval()
+
+
+def accuracy(head, features: torch.Tensor, labels: torch.Tensor) -> float:
+    with torch.no_grad():
+        return 100.0 * (head(features).argmax(dim=1) == labels).float().mean().item()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain only the classifier head on cached backbone features")
+    parser.add_argument("--backbone", required=True, help="ResNet checkpoint whose backbone stays frozen")
+    parser.add_argument("--classes", nargs="+", default=SELECTED_CLASSES, help="Class folders, in output order")
+    parser.add_argument("--data-root", default=DATA_ROOT)
+    parser.add_argument("--store", default="./outputs/feature_store")
+    parser.add_argument("--head", choices=["fc", "mlp"], default="fc")
+    parser.add_argument("--hidden", type=int, default=256, help="Hidden units of the mlp head")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--output", default="./outputs/head.pth")
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    start = time.time()
+
+    backbone = load_model(args.backbone)
+    trained_fc = backbone.fc
+    backbone.fc = nn.Identity()
+    store = FeatureStore(args.store, backbone=file_hash(args.backbone))
+
+    splits = {}
+    for split in ("train", "test"):
+        samples = list_samples(args.data_root, split, args.classes)
+        keys = extract_missing(backbone, samples, store, device)
+        splits[split] = (
+            torch.from_numpy(store.rows(keys)),
+            torch.tensor([label for _, label in samples]),
+        )
+
+    train_start = time.time()
+    head = build_head(args.head, len(args.classes), hidden=args.hidden)
+    # A linear head starts from the trained fc weights when the classes line up
+    if args.head == "fc" and list(args.classes[:len(SELECTED_CLASSES)]) == SELECTED_CLASSES:
+        with torch.no_grad():
+            head.weight[:trained_fc.out_features].copy_(trained_fc.weight)
+            head.bias[:trained_fc.out_features].copy_(trained_fc.bias)
+    head = train_head(head, *splits["train"], args.epochs, args.lr)
+    print(f"Head trained in {time.time() - train_start:.1f} sec (total {time.time() - start:.1f} sec)")
+    print(f"Test accuracy: {accuracy(head, *splits['test']):.2f}%")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    torch.save({
+        "head": args.head,
+        "hidden": args.hidden,
+        "classes": list(args.classes),
+        "backbone": os.path.basename(args.backbone),
+        "state_dict": head.state_dict(),
+    }, args.output)
+    labels_path = os.path.join(os.path.dirname(args.output) or ".", "labels.json")
+    with open(labels_path, "w") as f:
+        json.dump(list(args.classes), f, indent=2)
+    print(f"✅ Head saved to: {args.output} (labels: {labels_path})")
+
+
+if __name__ == "__main__":
+    main()
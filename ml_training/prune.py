@@ -0,0 +1,128 @@
+import argparse
+import os
+import time
+
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from tqdm import tqdm
+
+from common import (
+    DATA_ROOT, build_model, load_model, load_split, make_loader, residual_blocks,
+    save_checkpoint, train_transform,
+)
+from compare_models import compare, to_markdown
+
+# Structured channel pruning for the ResNet18 checkpoint.
+# Inside every residual block the conv1 -> bn1 -> conv2 path is cut to the most
+# important channels (L1 norm of conv1 filters, or |gamma| of bn1) and the weights
+# are physically sliced, giving a smaller dense network (arch "resnet18_pruned")
+# rather than masks, which would cost the same on CPU. The residual channels are
+# kept so skip connections need no re-alignment. Each variant is fine-tuned
+# briefly and then benchmarked for latency and accuracy.
+#
+#   python prune.py --model outputs/skin_disease_resnet18.pth --sparsity 0.25 0.5 0.75
+
+
+# Importance score per inner channel of a block
+def channel_importance(block, criterion: str):
+    if criterion == "bn":
+        return block.bn1.weight.detach().abs()
+    return block.conv1.weight.detach().abs().sum(dim=(1, 2, 3))
+
+
+# Return a physically smaller copy of a ResNet18 with `sparsity` of every block's
+# inner channels removed, plus the kept widths (the build_model config)
+def prune_resnet18(model, sparsity: float, criterion: str = "l1"):
+    keep_indices = []
+    for block in residual_blocks(model):
+        importance = channel_importance(block, criterion)
+        keep = max(1, round(len(importance) * (1 - sparsity)))
+        keep_indices.append(importance.topk(keep).indices.sort().values)
+
+    block_widths = [len(indices) for indices in keep_indices]
+    pruned = build_model("resnet18_pruned", model.fc.out_features, block_widths=block_widths)
+
+    # Everything outside the pruned paths is copied unchanged
+    state = pruned.state_dict()
+    for name, value in model.state_dict().items():
+        if state[name].shape == value.shape:
+            state[name] = value.clone()
+    pruned.load_state_dict(state)
+
+    with torch.no_grad():
+        for source, target, indices in zip(residual_blocks(model), residual_blocks(pruned), keep_indices):
+            target.conv1.weight.copy_(source.conv1.weight[indices])
+            for name in ("weight", "bias", "running_mean", "running_var"):
+                getattr(target.bn1, name).copy_(getattr(source.bn1, name)[indices])
+            target.conv2.weight.copy_(source.conv2.weight[:, indices])
+
+    return pruned.eval(), block_widths
+
+
+# Short recovery fine-tune after pruning (same loss/optimizer as train.ipynb)
+def fine_tune(model, train_loader, device, epochs: int, learning_rate: float):
+    model = model.to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    for epoch in range(epochs):
+        model.train()
+        running_loss = 0.0
+        start = time.time()
+        for images, labels in tqdm(train_loader, desc=f"Fine-tuning {epoch + 1}/{epochs}", leave=False):
+            images = images.to(device)
+            labels = labels.to(device)
+            optimizer.zero_grad()
+            loss = criterion(model(images), labels)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+        print(f"  epoch {epoch + 1}: loss {running_loss / max(1, len(train_loader)):.4f} "
+              f"({time.time() - start:.1f} sec)")
+    return model.eval()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured channel pruning of the ResNet18 checkpoint")
+    parser.add_argument("--model", required=True, help="ResNet18 checkpoint (train.ipynb output)")
+    parser.add_argument("--sparsity", type=float, nargs="+", default=[0.25, 0.5, 0.75],
+                        help="Fraction of each block's inner channels to remove")
+    parser.add_argument("--criterion", choices=["l1", "bn"], default="l1")
+    parser.add_argument("--epochs", type=int, default=2, help="Fine-tuning epochs per variant (0 to skip)")
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--data-root", default=DATA_ROOT, help="Pass '' to skip fine-tuning and accuracy")
+    parser.add_argument("--output-dir", default="./outputs")
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    os.makedirs(args.output_dir, exist_ok=True)
+    base = load_model(args.model)
+    train_loader = None
+    if args.data_root and args.epochs > 0:
+        train_loader = make_loader(load_split(args.data_root, "train", train_transform), shuffle=True)
+
+    paths = [args.model]
+    for sparsity in args.sparsity:
+        print(f"Pruning {sparsity:.0%} of inner channels ({args.criterion})")
+        pruned, block_widths = prune_resnet18(base, sparsity, args.criterion)
+        if train_loader is not None:
+            pruned = fine_tune(pruned, train_loader, device, args.epochs, args.lr)
+
+        path = os.path.join(args.output_dir, f"skin_disease_resnet18_pruned{round(sparsity * 100)}.pth")
+        save_checkpoint(pruned.cpu(), "resnet18_pruned", path, config={"block_widths": block_widths},
+                        sparsity=sparsity, criterion=args.criterion)
+        print(f"✅ Pruned model saved to: {path}")
+        paths.append(path)
+
+    rows = compare(paths, args.data_root, args.threads, device)
+    report = to_markdown(rows, args.threads)
+    print(report)
+    report_path = os.path.join(args.output_dir, "pruning_report.md")
+    with open(report_path, "w") as f:
+        f.write(report)
+    print(f"✅ Report saved to: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import calendar
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: segments of other processes are never recovered
+    fcntl = None
+
+# Non-blocking prediction audit log.
+# The request path only appends a tuple to a bounded in-memory buffer (dropping and
+# counting records when it is full). A background thread drains the buffer in
+# batches into append-only JSONL segment files, rotating each segment at a size
+# limit and gzip-compressing it once closed. Each process writes its own segments
+# (named with its owner token) and holds an exclusive lock on owner-<token>.lock
+# while running, so several workers can share one directory: at startup a worker
+# only finishes off segments whose owner's lock is free, i.e. whose process is gone.
+# read_segments() scans them offline:
+#
+#   python -m app.audit audit/ --since 2026-01-01
+
+
+class AuditLog:
+    def __init__(self, directory: str, capacity: int = 10000, flush_interval: float = 1.0,
+                 segment_bytes: int = 64 * 2 ** 20, compress: bool = True):
+        self.directory = directory
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.buffer = deque()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.segment = None
+        self.segment_path = None
+        self.thread = None
+        self.owner = uuid.uuid4().hex[:12]
+        self.owner_lock = None
+
+    def lock_path(self, owner: str) -> str:
+        return os.path.join(self.directory, f"owner-{owner}.lock")
+
+    # Open and exclusively lock an owner's lock file; None if a live process holds it
+    def try_lock(self, owner: str):
+        handle = open(self.lock_path(owner), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                return None
+        return handle
+
+    # Finish off segments left open by processes that are gone
+    def recover(self):
+        if fcntl is None:
+            return
+        segments = {}
+        for path in glob.glob(os.path.join(self.directory, "audit-*.jsonl")):
+            segments.setdefault(segment_owner(path), []).append(path)
+        owners = set(segments)
+        owners.update(os.path.basename(path)[6:-5] for path in glob.glob(self.lock_path("*")))
+        owners.discard(self.owner)
+        for owner in owners:
+            handle = self.try_lock(owner)
+            if handle is None:
+                continue  # still writing
+            try:
+                for path in sorted(segments.get(owner, [])):
+                    self.close_segment(path)
+                os.remove(self.lock_path(owner))
+            except FileNotFoundError:
+                pass  # another worker recovered it first
+            finally:
+                handle.close()
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Locked before it becomes visible, so no other worker can ever take it for a dead owner
+        path = self.lock_path(self.owner)
+        self.owner_lock = open(path + ".tmp", "w")
+        if fcntl is not None:
+            fcntl.flock(self.owner_lock, fcntl.LOCK_EX)
+        os.replace(path + ".tmp", path)
+        self.recover()
+        self.thread = threading.Thread(target=self.run, name="audit-writer", daemon=True)
+        self.thread.start()
+
+    # Request path: O(1), no I/O, no serialization
+    def record(self, input_hash: bytes, model_version: str, prediction: str, percentages,
+               latency: float, **extra):
+        entry = (time.time(), input_hash, model_version, prediction, percentages, latency, extra)
+        with self.lock:
+            if len(self.buffer) >= self.capacity:
+                metrics.increment("audit_dropped")
+                return
+            self.buffer.append(entry)
+            if len(self.buffer) >= self.capacity // 2:
+                self.wakeup.set()
+
+    def drain(self) -> list:
+        with self.lock:
+            entries = list(self.buffer)
+            self.buffer.clear()
+        return entries
+
+    @staticmethod
+    def serialize(entry) -> str:
+        timestamp, input_hash, model_version, prediction, percentages, latency, extra = entry
+        record = {
+            "ts": round(timestamp, 6),
+            "input_sha256": input_hash.hex(),
+            "model_version": model_version,
+            "prediction": prediction,
+            "percentages": percentages.tolist() if hasattr(percentages, "tolist") else list(percentages),
+            "latency_ms": round(latency * 1000, 3),
+        }
+        record.update(extra)
+        return json.dumps(record, separators=(",", ":"))
+
+    def open_segment(self):
+        name = (time.strftime("audit-%Y%m%dT%H%M%S", time.gmtime())
+                + f"-{time.time_ns() % 10 ** 9:09d}-{self.owner}.jsonl")
+        self.segment_path = os.path.join(self.directory, name)
+        self.segment = open(self.segment_path, "a", encoding="utf-8")
+
+    # Compress a finished segment (path.jsonl -> path.jsonl.gz); a segment that is
+    # already gone was compressed by another worker
+    def close_segment(self, path: str):
+        if not self.compress:
+            return
+        try:
+            with open(path, "rb") as source, gzip.open(path + ".gz.tmp", "wb") as target:
+                shutil.copyfileobj(source, target)
+            os.replace(path + ".gz.tmp", path + ".gz")
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def rotate(self):
+        self.segment.close()
+        path = self.segment_path
+        self.segment = None
+        self.close_segment(path)
+        metrics.increment("audit_segments_rotated")
+
+    def flush(self):
+        entries = self.drain()
+        if not entries:
+            return
+        if self.segment is None:
+            self.open_segment()
+        self.segment.write("".join(self.serialize(entry) + "\n" for entry in entries))
+        self.segment.flush()
+        metrics.increment("audit_written", len(entries))
+        if self.segment.tell() >= self.segment_bytes:
+            self.rotate()
+
+    def run(self):
+        while not self.stopping:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except OSError as exc:
+                metrics.increment("audit_write_errors")
+                print(f"Audit log write failed: {exc!r}")
+
+    # Flush what is buffered and close the current segment
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        self.flush()
+        if self.segment is not None:
+            self.rotate()
+        if self.owner_lock is not None:
+            os.remove(self.lock_path(self.owner))
+            self.owner_lock.close()
+            self.owner_lock = None
+
+
+# Owner token of a segment file (audit-<time>-<ns>-<owner>.jsonl)
+def segment_owner(path: str) -> str:
+    return os.path.basename(path).split(".", 1)[0].rsplit("-", 1)[1]
+
+
+def segment_start(path: str) -> float:
+    return calendar.timegm(time.strptime(os.path.basename(path)[6:21], "%Y%m%dT%H%M%S"))
+
+
+# Iterate audit records from every segment in a directory, in segment start order
+# (records of different workers interleave). `since` (unix seconds) skips whole
+# segments by name before opening them.
+def read_segments(directory: str, since: float = None):
+    paths = sorted(path for path in glob.glob(os.path.join(directory, "audit-*.jsonl*"))
+                   if path.endswith((".jsonl", ".jsonl.gz")))
+    # Start of the next segment written by the same owner, per segment
+    next_start = {}
+    latest = {}
+    for path in reversed(paths):
+        owner = segment_owner(path)
+        if owner in latest:
+            next_start[path] = latest[owner]
+        latest[owner] = segment_start(path)
+    for path in paths:
+        # that owner only opened its next segment after everything in this one was written
+        if since is not None and path in next_start and next_start[path] < since:
+            continue
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # partially written tail of a live segment
+                record = json.loads(line)
+                if since is None or record["ts"] >= since:
+                    yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize prediction audit segments")
+    parser.add_argument("directory")
+    parser.add_argument("--since", default=None, help="YYYY-MM-DD (UTC)")
+    args = parser.parse_args()
+
+    since = None
+    if args.since:
+        since = calendar.timegm(time.strptime(args.since, "%Y-%m-%d"))
+    start = time.perf_counter()
+    predictions = Counter()
+    versions = Counter()
+    latencies = []
+    for record in read_segments(args.directory, since):
+        predictions[record["prediction"]] += 1
+        versions[record["model_version"]] += 1
+        latencies.append(record["latency_ms"])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} records scanned in {elapsed:.2f} sec")
+    if latencies:
+        print(f"latency p50 {latencies[len(latencies) // 2]:.1f} ms, "
+              f"p99 {latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]:.1f} ms")
+    print("predictions:", dict(predictions.most_common()))
+    print("model versions:", dict(versions))
+
+
+if __name__ == "__main__":
+    main()
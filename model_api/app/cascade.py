@@ -0,0 +1,58 @@
+import json
+import os
+import torch
+import torch.nn.functional as F
+from . import metrics
+
+# Confidence-gated cascade.
+# A cheap first stage (a small model, or the full model at reduced input
+# resolution) answers every image; the full model only runs on the images whose
+# top softmax probability is below the threshold. The threshold is chosen offline
+# on the test split by ml_training/tune_cascade.py to bound the accuracy loss.
+
+FAST = "fast"
+FULL = "full"
+
+
+# tune_cascade.py report (threshold plus the first stage it was tuned for), if present
+def read_report(path: str):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+
+class Cascade:
+    # fast_model: first-stage network (may be the full model itself)
+    # resolution: input size for the first stage (images arrive at 224x224)
+    def __init__(self, fast_model, full_model, threshold: float, resolution: int = 224):
+        self.fast_model = fast_model
+        self.full_model = full_model
+        self.threshold = threshold
+        self.resolution = resolution
+
+    def describe(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "resolution": self.resolution,
+            "separate_fast_model": self.fast_model is not self.full_model,
+        }
+
+    # Probabilities [N, C] and the stage that answered each image
+    def __call__(self, batch):
+        with torch.no_grad():
+            fast_input = batch
+            if batch.shape[-1] != self.resolution:
+                fast_input = F.interpolate(batch, size=(self.resolution, self.resolution),
+                                           mode="bilinear", align_corners=False, antialias=True)
+            probabilities = torch.softmax(self.fast_model(fast_input), dim=1)
+
+            uncertain = probabilities.max(dim=1).values < self.threshold
+            escalated = int(uncertain.sum())
+            if escalated:
+                probabilities[uncertain] = torch.softmax(self.full_model(batch[uncertain]), dim=1)
+
+        metrics.increment("cascade_fast", len(batch) - escalated)
+        metrics.increment("cascade_escalated", escalated)
+        stages = [FULL if flag else FAST for flag in uncertain.tolist()]
+        return probabilities, stages
@@ -0,0 +1,50 @@
+import asyncio
+from . import metrics
+
+# Single-flight request coalescing.
+# Concurrent requests for the same key share one in-flight computation instead
+# of each running it. Nothing is stored: the entry disappears as soon as the
+# computation finishes, so this is independent of any result cache.
+
+
+class Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.in_flight = {}
+
+    # Await compute() for key, or join the computation already running for it
+    async def run(self, key, compute):
+        flight = self.in_flight.get(key)
+        if flight is None:
+            metrics.increment(self.name + "_leaders")
+            flight = Flight(asyncio.ensure_future(compute()))
+            self.in_flight[key] = flight
+            flight.task.add_done_callback(lambda _: self.forget(key, flight))
+        else:
+            metrics.increment(self.name + "_coalesced")
+
+        flight.waiters += 1
+        try:
+            # shield: one caller going away must not cancel the work the others wait on
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # ...but once the last caller is gone nobody will read the result
+            if flight.waiters == 1:
+                # unregister first: an identical request arriving before the task
+                # has finished cancelling must start a fresh flight, not join this one
+                self.forget(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    # Drop key's entry if it still refers to this flight (a newer one may have replaced it)
+    def forget(self, key, flight: Flight):
+        if self.in_flight.get(key) is flight:
+            del self.in_flight[key]
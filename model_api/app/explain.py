@@ -0,0 +1,66 @@
+import base64
+import io
+import threading
+import numpy as np
+import torch
+from PIL import Image
+
+# Class activation maps (CAM) from the prediction's own forward pass.
+# The ResNet ends in global-average-pool + fc, so the map for class c is just the
+# fc weights of c applied to every layer4 position: no backward pass and no
+# second forward pass. A forward hook on layer4 keeps its output, but only on
+# threads that asked for it, so plain predictions running concurrently on the
+# same model are unaffected.
+
+
+class CamExplainer:
+    def __init__(self, model):
+        if not hasattr(model, "layer4") or not isinstance(getattr(model, "fc", None), torch.nn.Linear):
+            raise ValueError("CAM needs a ResNet-style model with layer4 and a linear fc head")
+        self.model = model
+        self.local = threading.local()
+        model.layer4.register_forward_hook(self.capture)
+
+    def capture(self, module, inputs, output):
+        if getattr(self.local, "active", False):
+            self.local.features = output
+
+    # Probabilities [N, C] and layer4 activations [N, 512, h, w] from one forward pass
+    def forward(self, batch):
+        self.local.active = True
+        try:
+            with torch.no_grad():
+                probabilities = torch.softmax(self.model(batch), dim=1)
+            return probabilities, self.local.features
+        finally:
+            self.local.active = False
+            self.local.features = None
+
+    # CAM for one class per image, scaled to 0..1, shape [N, h, w]
+    def cams(self, features, classes):
+        weights = self.model.fc.weight[classes]  # [N, 512]
+        with torch.no_grad():
+            maps = torch.relu(torch.einsum("nc,nchw->nhw", weights, features))
+            peak = maps.flatten(1).max(dim=1).values.clamp_min(1e-8)
+        return maps / peak[:, None, None]
+
+
+# CAM as a size x size grid of 0-255 ints
+def heatmap_grid(cam, size: int) -> list:
+    image = Image.fromarray((cam.numpy() * 255).astype(np.uint8), "L")
+    return np.asarray(image.resize((size, size), Image.BILINEAR)).tolist()
+
+
+# Jet-like colour map for values in 0..1, shape [..., 3] uint8
+def colormap(values: np.ndarray) -> np.ndarray:
+    channels = [np.clip(1.5 - np.abs(4 * values - offset), 0, 1) for offset in (3, 2, 1)]
+    return (np.stack(channels, axis=-1) * 255).astype(np.uint8)
+
+
+# Base64 PNG of the CAM blended over the (already 224x224) input image
+def overlay_png(cam, image: Image.Image, opacity: float = 0.45) -> str:
+    heat = Image.fromarray((cam.numpy() * 255).astype(np.uint8), "L").resize(image.size, Image.BILINEAR)
+    colored = Image.fromarray(colormap(np.asarray(heat, dtype=np.float32) / 255), "RGB")
+    buffer = io.BytesIO()
+    Image.blend(image.convert("RGB"), colored, opacity).save(buffer, format="PNG", optimize=False)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
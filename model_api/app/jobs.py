@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from starlette.concurrency import run_in_threadpool
+from . import metrics
+
+# Asynchronous scoring jobs backed by a local SQLite queue.
+# A submission streams its images into the database in small groups (the job is
+# not claimable until the upload is complete) and returns a job ID at once;
+# a background worker claims items in chunks, runs them through the same batched
+# scheduler as /predict/ (in the bulk lane) and writes each chunk's results in
+# one transaction. Completed items are the checkpoint. Several workers can share
+# one database: a claim is a lease (owner + claim time), and claimed items go back
+# to pending only once their lease has expired or their owner process is gone,
+# so a worker starting up never requeues items another worker is still running.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    filename TEXT,
+    data BLOB,
+    result TEXT,
+    owner TEXT,
+    claimed_at REAL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS items_pending ON items (status, job_id, seq);
+"""
+
+UPLOADING = "uploading"
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# How often an idle worker looks for expired leases and work submitted elsewhere (seconds)
+RECOVER_INTERVAL = 30.0
+
+
+# Owner ID of this worker process: host, pid and a token telling it apart from an
+# earlier process that had the same pid
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# False only when the owner is known to be gone (same host, and its pid is dead or
+# now belongs to this process); owners on other hosts are left to lease expiry
+def owner_alive(owner: str, me: str) -> bool:
+    host, pid, _ = owner.rsplit(":", 2)
+    if host != me.split(":", 1)[0]:
+        return True
+    if int(pid) == os.getpid():
+        return owner == me
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    # classify: coroutine function bytes -> result dict (raises on unusable input)
+    # error_detail: maps an exception raised by classify to a JSON-able error
+    # ready: coroutine function the worker awaits before claiming any work
+    # lease: seconds after which a claimed item may be requeued; longer than a chunk can take
+    def __init__(self, db_path: str, classify, error_detail, ready=None, chunk_size: int = 32,
+                 lease: float = 3600):
+        self.db_path = db_path
+        self.classify = classify
+        self.error_detail = error_detail
+        self.ready = ready
+        self.chunk_size = chunk_size
+        self.lease = lease
+        self.owner = worker_id()
+        self.lock = threading.Lock()
+        self.db = None
+        self.work_available = None
+        self.progress = {}
+        self.worker = None
+
+    # Open the database, requeue interrupted items and start the worker
+    def start(self):
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None,
+                                  timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        # Databases created before leases existed
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(items)")}
+        for column, kind in (("owner", "TEXT"), ("claimed_at", "REAL")):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE items ADD COLUMN {column} {kind}")
+        self.recover()
+        self.work_available = asyncio.Event()
+        self.work_available.set()
+        self.worker = asyncio.ensure_future(self.run())
+
+    def execute(self, sql: str, params=()):
+        with self.lock:
+            return self.db.execute(sql, params).fetchall()
+
+    # New job row, not claimable until seal()
+    def create(self) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.execute(
+            "INSERT INTO jobs (id, status, total, created_at, updated_at) VALUES (?, ?, 0, ?, ?)",
+            (job_id, UPLOADING, now, now),
+        )
+        return job_id
+
+    # Store one group of (seq, filename, bytes) items in one transaction
+    def add_items(self, job_id: str, items: list):
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT INTO items (job_id, seq, status, filename, data) VALUES (?, ?, ?, ?, ?)",
+                ((job_id, seq, PENDING, name, data) for seq, name, data in items),
+            )
+            self.db.execute("COMMIT")
+
+    def seal(self, job_id: str, total: int):
+        self.execute("UPDATE jobs SET status = ?, total = ?, updated_at = ? WHERE id = ?",
+                     (PENDING, total, time.time(), job_id))
+
+    def delete(self, job_id: str):
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.execute("DELETE FROM items WHERE job_id = ?", (job_id,))
+            self.db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self.db.execute("COMMIT")
+
+    # Persist a new job from an async iterator of (filename, bytes), holding at most
+    # one group of images in memory; returns (job ID, item count). An upload that
+    # fails part-way leaves nothing behind.
+    async def submit(self, uploads):
+        job_id = await run_in_threadpool(self.create)
+        total = 0
+        group = []
+        try:
+            async for name, data in uploads:
+                group.append((total, name, data))
+                total += 1
+                if len(group) >= self.chunk_size:
+                    await run_in_threadpool(self.add_items, job_id, group)
+                    group = []
+            if group:
+                await run_in_threadpool(self.add_items, job_id, group)
+            await run_in_threadpool(self.seal, job_id, total)
+        except BaseException:
+            await asyncio.shield(run_in_threadpool(self.delete, job_id))
+            raise
+        metrics.increment("jobs_submitted")
+        metrics.increment("jobs_items_submitted", total)
+        self.work_available.set()
+        return job_id, total
+
+    def status(self, job_id: str):
+        rows = self.execute(
+            "SELECT id, status, total, done, failed, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+        )
+        if not rows:
+            return None
+        keys = ("job_id", "status", "total", "done", "failed", "created_at", "updated_at")
+        return dict(zip(keys, rows[0]))
+
+    # Job status, waiting up to `wait` seconds for progress if the job is unfinished
+    async def poll(self, job_id: str, wait: float = 0):
+        status = await run_in_threadpool(self.status, job_id)
+        if status is None or wait <= 0 or status["status"] in (DONE, FAILED):
+            return status
+        event = self.progress.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+        return await run_in_threadpool(self.status, job_id)
+
+    # One page of results in submission order: the finished items from `offset` up to
+    # the first unfinished one. Returns (results, next offset or None at the end); while
+    # items are unfinished the next offset points at the first of them, so following it
+    # never skips an item that completes out of order.
+    def results(self, job_id: str, offset: int, limit: int):
+        rows = self.execute(
+            "SELECT seq, filename, status, result FROM items WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+            (job_id, offset, limit),
+        )
+        page = []
+        for seq, name, status, result in rows:
+            if status not in (DONE, FAILED):
+                return page, seq
+            page.append({"index": seq, "filename": name, "status": status, **json.loads(result)})
+        return page, (rows[-1][0] + 1 if len(rows) == limit else None)
+
+    # Requeue claimed items whose lease expired or whose owner process is gone
+    def recover(self):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            owners = [row[0] for row in self.db.execute(
+                "SELECT DISTINCT owner FROM items WHERE status = ? AND owner IS NOT NULL", (RUNNING,)
+            )]
+            dead = [owner for owner in owners if not owner_alive(owner, self.owner)]
+            resumed = self.db.execute(
+                "UPDATE items SET status = ?, owner = NULL, claimed_at = NULL"
+                " WHERE status = ? AND (owner IS NULL OR claimed_at < ?)",
+                (PENDING, RUNNING, time.time() - self.lease),
+            ).rowcount
+            for owner in dead:
+                resumed += self.db.execute(
+                    "UPDATE items SET status = ?, owner = NULL, claimed_at = NULL WHERE status = ? AND owner = ?",
+                    (PENDING, RUNNING, owner),
+                ).rowcount
+            self.db.execute("COMMIT")
+        if resumed:
+            metrics.increment("jobs_items_resumed", resumed)
+        return resumed
+
+    # Claim (lease) the next chunk of pending items, oldest job first
+    def claim(self) -> list:
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            rows = self.db.execute(
+                "SELECT items.job_id, items.seq, items.data FROM items JOIN jobs ON jobs.id = items.job_id"
+                " WHERE items.status = ? AND jobs.status != ? ORDER BY jobs.created_at, items.seq LIMIT ?",
+                (PENDING, UPLOADING, self.chunk_size),
+            ).fetchall()
+            now = time.time()
+            self.db.executemany(
+                "UPDATE items SET status = ?, owner = ?, claimed_at = ? WHERE job_id = ? AND seq = ?",
+                ((RUNNING, self.owner, now, job_id, seq) for job_id, seq, _ in rows),
+            )
+            self.db.executemany(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                ((RUNNING, now, job_id, PENDING) for job_id in {row[0] for row in rows}),
+            )
+            self.db.execute("COMMIT")
+        return rows
+
+    # Checkpoint a chunk: item results and job counters in one transaction.
+    # Items whose lease was lost in the meantime are left to their new owner.
+    def record(self, outcomes: list):
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            for job_id, seq, status, result in outcomes:
+                updated = self.db.execute(
+                    "UPDATE items SET status = ?, result = ?, data = NULL, owner = NULL"
+                    " WHERE job_id = ? AND seq = ? AND status = ? AND owner = ?",
+                    (status, json.dumps(result), job_id, seq, RUNNING, self.owner),
+                ).rowcount
+                if not updated:
+                    metrics.increment("jobs_items_lease_lost")
+                    continue
+                column = "done" if status == DONE else "failed"
+                self.db.execute(
+                    f"UPDATE jobs SET {column} = {column} + 1, updated_at = ? WHERE id = ?", (now, job_id)
+                )
+            self.db.execute(
+                "UPDATE jobs SET status = ? WHERE status = ? AND done + failed >= total", (DONE, RUNNING)
+            )
+            self.db.execute("COMMIT")
+
+    async def process(self, job_id: str, seq: int, data: bytes):
+        try:
+            return job_id, seq, DONE, await self.classify(data)
+        except Exception as exc:
+            return job_id, seq, FAILED, {"error": self.error_detail(exc)}
+
+    async def run(self):
+        if self.ready is not None:
+            await self.ready()
+        while True:
+            try:
+                await asyncio.wait_for(self.work_available.wait(), timeout=RECOVER_INTERVAL)
+            except asyncio.TimeoutError:
+                # Idle: pick up work left by a dead worker or submitted to another one
+                await run_in_threadpool(self.recover)
+            chunk = await run_in_threadpool(self.claim)
+            if not chunk:
+                self.work_available.clear()
+                continue
+
+            # All items of the chunk are in flight together, so the scheduler batches them
+            outcomes = await asyncio.gather(*(self.process(*row) for row in chunk))
+            await run_in_threadpool(self.record, outcomes)
+            metrics.increment("jobs_items_done", sum(1 for outcome in outcomes if outcome[2] == DONE))
+            metrics.increment("jobs_items_failed", sum(1 for outcome in outcomes if outcome[2] == FAILED))
+
+            for job_id in {outcome[0] for outcome in outcomes}:
+                event = self.progress.pop(job_id, None)
+                if event is not None:
+                    event.set()
@@ -0,0 +1,279 @@
+import os
+import json
+import hashlib
+import shutil
+import threading
+import time
+import urllib.request
+
+# Background model loader.
+# torch/torchvision are imported here, off the import path of app.main, so uvicorn
+# can bind the port and answer liveness checks while the model is still loading.
+
+# Model config
+model_url = "https://www.dropbox.com/scl/fi/mu7vcde9i971765otbv9y/model.pth?rlkey=aknqcedutttfj37n5q35kj3eg&st=ys7g0nvb&dl=1"
+model_path = os.environ.get("MODEL_PATH", "model.pth")
+# Optional classifier head (ml_training/finetune_head.py) swapped in for model.fc
+head_path = os.environ.get("HEAD_PATH")
+
+# Class names in order; LABELS_PATH points at a labels.json (list of names) when the
+# served head was trained on a different class list
+class_names = ['Acne', 'Eczema', 'Psoriasis', 'Warts', 'SkinCancer', 'Unknown_Normal']
+if os.environ.get("LABELS_PATH"):
+    with open(os.environ["LABELS_PATH"]) as f:
+        class_names = json.load(f)
+
+# Populated by load(); readers must check `ready` first
+model = None
+transform = None
+tuning = {}
+cascade = None
+explainer = None
+model_version = None
+load_error = None
+timings = {}
+ready = threading.Event()
+
+process_start = time.perf_counter()
+
+
+# Define the download function (stdlib only, written atomically)
+def download_model_from_dropbox(url: str, save_path: str):
+    print("Downloading model from Dropbox...")
+    partial_path = save_path + ".part"
+    with urllib.request.urlopen(url) as response, open(partial_path, "wb") as f:
+        shutil.copyfileobj(response, f)
+    os.replace(partial_path, save_path)
+    print("Model downloaded.")
+
+
+# ResNet18 residual blocks in forward order (layer1[0] ... layer4[1])
+def residual_blocks(model) -> list:
+    return [block for layer in (model.layer1, model.layer2, model.layer3, model.layer4) for block in layer]
+
+
+# Build an untrained network for a checkpoint architecture.
+# block_widths (resnet18_pruned only): inner channel count of each of the 8 blocks.
+def build_model(arch: str = "resnet18", num_classes: int = 6, block_widths=None):
+    import torch
+
+    if arch == "resnet18":
+        from torchvision.models import resnet18
+        model = resnet18(weights=None)
+        model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+    elif arch == "resnet18_pruned":
+        # Channel-pruned ResNet18: each block's conv1 -> bn1 -> conv2 path is narrower,
+        # the residual (block output) channels are unchanged
+        model = build_model("resnet18", num_classes)
+        for block, width in zip(residual_blocks(model), block_widths):
+            block.conv1 = torch.nn.Conv2d(block.conv1.in_channels, width, kernel_size=3,
+                                          stride=block.conv1.stride, padding=1, bias=False)
+            block.bn1 = torch.nn.BatchNorm2d(width)
+            block.conv2 = torch.nn.Conv2d(width, block.conv2.out_channels, kernel_size=3,
+                                          stride=1, padding=1, bias=False)
+    elif arch == "resnet_lite":
+        # ResNet18 with one BasicBlock per stage instead of two
+        from torchvision.models.resnet import ResNet, BasicBlock
+        model = ResNet(BasicBlock, [1, 1, 1, 1], num_classes=num_classes)
+    elif arch == "mobilenet_v3_small":
+        from torchvision.models import mobilenet_v3_small
+        model = mobilenet_v3_small(weights=None, num_classes=num_classes)
+    else:
+        raise ValueError(f"Unknown model architecture: {arch}")
+    return model
+
+
+# Classifier head on the 512-d pooled ResNet features: "fc" (linear, same as the
+# trained model) or "mlp" (one hidden layer)
+def build_head(kind: str = "fc", num_classes: int = 6, in_features: int = 512, hidden: int = 256):
+    import torch
+
+    if kind == "mlp":
+        return torch.nn.Sequential(
+            torch.nn.Linear(in_features, hidden),
+            torch.nn.ReLU(),
+            torch.nn.Dropout(0.2),
+            torch.nn.Linear(hidden, num_classes),
+        )
+    if kind != "fc":
+        raise ValueError(f"Unknown head type: {kind}")
+    return torch.nn.Linear(in_features, num_classes)
+
+
+# Load a head checkpoint; returns (head module, class names it predicts)
+def load_head(path: str):
+    import torch
+
+    checkpoint = torch.load(path, map_location=torch.device("cpu"))
+    head = build_head(checkpoint["head"], len(checkpoint["classes"]), hidden=checkpoint.get("hidden", 256))
+    head.load_state_dict(checkpoint["state_dict"])
+    head.eval()
+    return head, checkpoint["classes"]
+
+
+# Load a checkpoint for serving.
+# Accepts either a bare ResNet18 state dict (what train.ipynb saves) or a
+# {"arch", "num_classes", "config", "state_dict"} checkpoint written by the
+# ml_training tools, where config holds extra build_model arguments.
+def load_model(model_path: str):
+    import torch
+
+    checkpoint = torch.load(model_path, map_location=torch.device("cpu"))
+    if isinstance(checkpoint, dict) and "state_dict" in checkpoint:
+        model = build_model(checkpoint.get("arch", "resnet18"), checkpoint.get("num_classes", 6),
+                            **checkpoint.get("config", {}))
+        checkpoint = checkpoint["state_dict"]
+    else:
+        model = build_model()
+    model.load_state_dict(checkpoint)
+    model.eval()
+    return model
+
+
+# Define the image transform
+def build_transform():
+    from torchvision import transforms
+
+    return transforms.Compose([
+        transforms.Resize((224, 224)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                             std=[0.229, 0.224, 0.225]),
+    ])
+
+
+# Short content hash identifying the served weights (model file plus head, if any)
+def weights_version(*paths) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        if path:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return f"{os.path.basename(model_path)}@{digest.hexdigest()[:12]}"
+
+
+# Import, download, load and tune; records per-phase timings in seconds
+def load(tuning_options: dict, cascade_options: dict):
+    global model, transform, tuning, cascade, explainer, model_version, load_error
+
+    try:
+        start = time.perf_counter()
+        import torch  # noqa: F401
+        from .tuning import autotune
+        transform = build_transform()
+        timings["import_s"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        if not os.path.exists(model_path):
+            download_model_from_dropbox(model_url, model_path)
+        timings["download_s"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        loaded = load_model(model_path)
+        if head_path:
+            # Refreshed head on the unchanged backbone
+            head, head_classes = load_head(head_path)
+            if list(head_classes) != list(class_names):
+                raise ValueError(f"Head classes {head_classes} do not match served classes {class_names}")
+            loaded.fc = head
+        if cascade_options.get("enabled"):
+            cascade = build_cascade(loaded, cascade_options)
+        explainer = build_explainer(loaded)
+        timings["load_s"] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        tuning = autotune(loaded, **tuning_options)
+        timings["tune_s"] = round(time.perf_counter() - start, 3)
+
+        model_version = weights_version(model_path, head_path)
+        model = loaded
+        timings["ready_after_s"] = round(time.perf_counter() - process_start, 3)
+        ready.set()
+    except Exception as exc:
+        load_error = repr(exc)
+        print(f"Model loading failed: {load_error}")
+        raise
+
+
+# Cascade around the full model; the first stage is CASCADE_MODEL_PATH if given,
+# otherwise the full model itself at reduced resolution. Without an explicit
+# threshold, the tune_cascade.py report must exist and match this first stage
+# (a threshold only bounds the accuracy loss for the stage it was tuned on);
+# with neither, the cascade stays off.
+def build_cascade(full_model, options: dict):
+    from .cascade import Cascade, read_report
+
+    fast_path = options.get("model_path")
+    threshold = options.get("threshold")
+    resolution = options.get("resolution")
+    if threshold is None:
+        report_path = options.get("report")
+        report = read_report(report_path)
+        if report is None:
+            print(f"Warning: CASCADE=1 but no CASCADE_THRESHOLD and no tuned report at {report_path}; "
+                  "cascade disabled")
+            return None
+        fast_name = os.path.basename(fast_path) if fast_path else None
+        if report.get("fast_model") != fast_name:
+            raise ValueError(f"Cascade report {report_path} was tuned for first stage "
+                             f"{report.get('fast_model') or 'full model'}, not {fast_name or 'full model'}")
+        if resolution and resolution != report["resolution"]:
+            raise ValueError(f"Cascade report {report_path} was tuned at resolution {report['resolution']}, "
+                             f"not CASCADE_RESOLUTION={resolution}")
+        threshold = float(report["threshold"])
+        resolution = report["resolution"]
+
+    fast_model = load_model(fast_path) if fast_path else full_model
+    return Cascade(fast_model, full_model, threshold, resolution or (224 if fast_path else 128))
+
+
+# CAM explainer hooked into the model, or None if the architecture has no
+# layer4 + linear fc (e.g. mobilenet_v3_small or an mlp head)
+def build_explainer(full_model):
+    from .explain import CamExplainer
+
+    try:
+        return CamExplainer(full_model)
+    except ValueError:
+        return None
+
+
+# Softmax probabilities for a batch of transformed images, shape [N, num_classes]
+def infer(batch):
+    import torch
+
+    with torch.no_grad():
+        return torch.softmax(model(batch), dim=1)
+
+
+# (probabilities, predicted index, CAM) for a list of transformed [3, H, W] images,
+# one per image; always the full model (no cascade). Runs on the scheduler's
+# inference thread like classify_images.
+def explain_images(images: list):
+    import torch
+
+    probabilities, features = explainer.forward(torch.stack(images))
+    predicted = probabilities.argmax(dim=1)
+    cams = explainer.cams(features, predicted)
+    return list(zip(probabilities, predicted.tolist(), cams))
+
+
+# (probabilities, stage) for a list of transformed [3, H, W] images, one per image.
+# stage is None unless the cascade is enabled.
+def classify_images(images: list):
+    import torch
+
+    batch = torch.stack(images)
+    if cascade is None:
+        return [(row, None) for row in infer(batch)]
+    probabilities, stages = cascade(batch)
+    return list(zip(probabilities, stages))
+
+
+# Start loading in a daemon thread and return immediately
+def start_background_load(tuning_options: dict, cascade_options: dict):
+    thread = threading.Thread(target=load, args=(tuning_options, cascade_options),
+                              name="model-loader", daemon=True)
+    thread.start()
+    return thread
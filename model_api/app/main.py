@@ -1,72 +1,454 @@
+import io
 import os
-import torch
-from fastapi import FastAPI, File, UploadFile
-from torchvision import models, transforms
+import json
+import time
+import asyncio
+import hashlib
+from typing import List
+from fastapi import FastAPI, File, UploadFile, Request, Response, HTTPException, WebSocket
+from starlette.concurrency import run_in_threadpool
 from PIL import Image
-import requests
-import torch.nn.functional as F
+from . import loader, metrics, quality
+from .coalesce import SingleFlight
+from .jobs import JobQueue
+from .audit import AuditLog
+from .stream import FrameStream
+from .scheduler import DeadlineScheduler, DeadlineExceeded, Lane, check_deadline
 
 app = FastAPI()
 
-# Define the download function
-def download_model_from_dropbox(url: str, save_path: str):
-    print("Downloading model from Dropbox...")
-    response = requests.get(url)
-    with open(save_path, 'wb') as f:
-        f.write(response.content)
-    print("Model downloaded.")
-
-# Load the model directly as ResNet18 (no wrapper)
-def load_model(model_path: str):
-    num_classes = 6
-    model = models.resnet18(pretrained=False)
-    model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
-    model.load_state_dict(torch.load(model_path, map_location=torch.device("cpu")))
-    model.eval()
-    return model
-
-# Define the image transform
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                         std=[0.229, 0.224, 0.225]),
-])
-
-# Model config
-model_url = "https://www.dropbox.com/scl/fi/mu7vcde9i971765otbv9y/model.pth?rlkey=aknqcedutttfj37n5q35kj3eg&st=ys7g0nvb&dl=1"
-model_path = "model.pth"
-
-# Download and load the model
-if not os.path.exists(model_path):
-    download_model_from_dropbox(model_url, model_path)
-
-model = load_model(model_path)
+# Read an optional integer setting from the environment
+def env_int(name: str):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+# Parse "name:value,name:value" settings from the environment
+def env_mapping(name: str, default: str) -> dict:
+    pairs = (item.split(":", 1) for item in os.environ.get(name, default).split(",") if item)
+    return {key.strip(): value.strip() for key, value in pairs}
+
+# Thread-pool settings handed to the tuner once the model is loaded
+# (TORCH_NUM_THREADS / TORCH_INTEROP_THREADS / INFERENCE_BATCH_SIZE override the
+# benchmark, AUTOTUNE=0 skips it)
+tuning_options = {
+    "num_threads": env_int("TORCH_NUM_THREADS"),
+    "interop_threads": env_int("TORCH_INTEROP_THREADS"),
+    "batch_size": env_int("INFERENCE_BATCH_SIZE"),
+    "benchmark": os.environ.get("AUTOTUNE", "1") != "0",
+}
+
+# Confidence-gated cascade (CASCADE=1): a fast first stage answers confident images,
+# the full model only the uncertain ones. The threshold comes from CASCADE_THRESHOLD
+# or the tune_cascade.py report at CASCADE_REPORT, which also fixes the first-stage
+# resolution; with neither the cascade stays off.
+cascade_options = {
+    "enabled": os.environ.get("CASCADE", "0") == "1",
+    "model_path": os.environ.get("CASCADE_MODEL_PATH"),
+    "resolution": env_int("CASCADE_RESOLUTION"),
+    "threshold": float(os.environ["CASCADE_THRESHOLD"]) if os.environ.get("CASCADE_THRESHOLD") else None,
+    "report": os.environ.get("CASCADE_REPORT", "cascade.json"),
+}
+
+# Pre-inference quality gate (QUALITY_GATE=0 disables it)
+quality_gate_enabled = os.environ.get("QUALITY_GATE", "1") != "0"
+
+# Deadline applied when the caller sends none (seconds); matches the web proxy's timeout
+DEFAULT_REQUEST_TIMEOUT = float(os.environ.get("DEFAULT_REQUEST_TIMEOUT", "25"))
+# How often a waiting request checks whether its client has disconnected (seconds)
+DISCONNECT_POLL_INTERVAL = 0.1
+
+# Priority lanes: weighted share of inference batch slots and max concurrent requests
+# per lane (0 = unlimited). Interactive traffic is the default lane; bulk callers
+# select theirs with an X-Priority header or an API key listed in LANE_API_KEYS.
+lane_weights = env_mapping("LANE_WEIGHTS", "interactive:4,bulk:1")
+lane_concurrency = env_mapping("LANE_CONCURRENCY", "interactive:0,bulk:4")
+lane_api_keys = env_mapping("LANE_API_KEYS", "")
+lanes = [
+    Lane(name, weight=int(weight), concurrency=int(lane_concurrency.get(name, 0)))
+    for name, weight in lane_weights.items()
+]
+
+# Batches queued images by lane and deadline; batch size is MAX_BATCH_SIZE or the tuned one
+max_batch_override = env_int("MAX_BATCH_SIZE")
+scheduler = DeadlineScheduler(
+    loader.classify_images,
+    max_batch_size=lambda: max_batch_override or loader.tuning.get("batch_size", 1),
+    lanes=lanes,
+)
+
+# Prediction audit log (AUDIT_DIR; AUDIT=0 disables it)
+audit_log = None
+if os.environ.get("AUDIT", "1") != "0":
+    audit_log = AuditLog(
+        os.environ.get("AUDIT_DIR", "audit"),
+        capacity=env_int("AUDIT_BUFFER") or 10000,
+        flush_interval=float(os.environ.get("AUDIT_FLUSH_INTERVAL", "1.0")),
+        segment_bytes=(env_int("AUDIT_SEGMENT_MB") or 64) * 2 ** 20,
+    )
+
+# Load the model in the background so the port is bound immediately
+@app.on_event("startup")
+async def start_model_loading():
+    loader.start_background_load(tuning_options, cascade_options)
+    scheduler.start()
+    job_queue.start()
+    if audit_log is not None:
+        audit_log.start()
+
+# Write out buffered audit records on shutdown
+@app.on_event("shutdown")
+async def flush_audit_log():
+    if audit_log is not None:
+        await run_in_threadpool(audit_log.stop)
 
 # Class names in order
-class_names = ['Acne', 'Eczema', 'Psoriasis', 'Warts', 'SkinCancer', 'Unknown_Normal']
+class_names = loader.class_names
+
+# Precomputed response schema: one JSON prefix per predicted class plus a format
+# string for the percentages, so the body is built without FastAPI's generic encoder
+json_prefixes = [
+    '{"prediction":%s,"confidence_percentages":{' % json.dumps(name) for name in class_names
+]
+json_percentages = ",".join(
+    "%s:{}" % json.dumps(name) for name in class_names
+) + "}}"
+# Closing of the body, with the answering cascade stage when there is one
+json_suffixes = {stage: ',"stage":%s}' % json.dumps(stage) for stage in ("fast", "full")}
+json_suffixes[None] = "}"
+
+# Compact binary mode: float32 percentages in class order, class names sent as a header
+BINARY_MEDIA_TYPE = "application/octet-stream"
+class_names_header = ",".join(class_names)
+
+# Convert the whole probability vector in one vectorized step (single host sync)
+def to_percentages(probabilities):
+    return probabilities.double().mul_(100).numpy().round(2)
+
+# Encode a prediction according to the Accept header (JSON by default)
+def encode_prediction(predicted: int, percentages, accept: str, stage: str = None) -> Response:
+    if BINARY_MEDIA_TYPE in accept:
+        headers = {"X-Class-Names": class_names_header, "X-Prediction": class_names[predicted]}
+        if stage:
+            headers["X-Stage"] = stage
+        return Response(content=percentages.astype("<f4").tobytes(), media_type=BINARY_MEDIA_TYPE, headers=headers)
+    body = json_prefixes[predicted] + json_percentages.format(*percentages.tolist()) + json_suffixes[stage]
+    return Response(content=body, media_type="application/json")
+
+# Reject requests until the background loader has finished
+def require_model():
+    if not loader.ready.is_set():
+        detail = "Model failed to load" if loader.load_error else "Model is still loading"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+# Short-circuit unusable uploads before paying for the forward pass
+def require_usable(image: Image.Image):
+    if not quality_gate_enabled:
+        return
+    failures = quality.check_image(image)
+    if failures:
+        for item in failures:
+            metrics.increment("quality_rejected_" + item["check"])
+        metrics.increment("quality_rejected")
+        raise HTTPException(status_code=422, detail={"error": "image_quality", "reasons": failures})
+
+# Decode and gate one upload
+def decode(data: bytes) -> Image.Image:
+    # Open the image
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    require_usable(image)
+    return image
+
+# Decode, gate and transform one upload into a model input tensor
+def prepare(data: bytes):
+    return loader.transform(decode(data))
+
+# Classify one upload; returns (predicted index, percentages, cascade stage or None).
+# Work is skipped as soon as the deadline has passed, both before decode and
+# while queued for inference.
+async def classify(data: bytes, deadline: float, lane: str):
+    async with scheduler.slot(lane):
+        check_deadline(deadline, "decode")
+        image = await run_in_threadpool(prepare, data)
+
+        # Perform inference: softmax probabilities for each class
+        probabilities, stage = await scheduler.submit(image, deadline, lane)
+
+    # Get the class with the highest probability
+    return int(probabilities.argmax()), to_percentages(probabilities), stage
+
+# Deadline (monotonic clock) from X-Request-Deadline (unix epoch seconds) or
+# X-Request-Timeout (seconds from now), falling back to DEFAULT_REQUEST_TIMEOUT
+def request_deadline(request: Request) -> float:
+    try:
+        absolute = request.headers.get("x-request-deadline")
+        if absolute:
+            return time.monotonic() + float(absolute) - time.time()
+        timeout = request.headers.get("x-request-timeout")
+        if timeout:
+            return time.monotonic() + float(timeout)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid deadline header")
+    return time.monotonic() + DEFAULT_REQUEST_TIMEOUT
+
+# Priority lane for a request or WebSocket: API key mapping first, then the X-Priority header
+def request_lane(request) -> str:
+    lane = lane_api_keys.get(request.headers.get("x-api-key", "")) or request.headers.get("x-priority")
+    if not lane:
+        return scheduler.default_lane
+    if lane not in scheduler.lanes:
+        raise HTTPException(status_code=400, detail=f"Unknown priority lane: {lane}")
+    return lane
+
+# Await work for a request, cancelling it if the client disconnects first
+async def unless_disconnected(request: Request, work):
+    task = asyncio.ensure_future(work)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            metrics.increment("client_disconnected")
+            task.cancel()
+            # 499: client closed request (nobody receives this body)
+            raise HTTPException(status_code=499, detail="Client disconnected")
+
+# Identical uploads in the same lane arriving while the first copy is still being
+# computed share its result
+predictions_in_flight = SingleFlight("predict")
+
+# Classify through the shared flight for (lane, upload). A request that joined a flight
+# whose (earlier) deadline expired retries with its own deadline instead of failing.
+async def classify_shared(data: bytes, key: bytes, deadline: float, lane: str):
+    try:
+        return await predictions_in_flight.run((lane, key), lambda: classify(data, deadline, lane))
+    except DeadlineExceeded:
+        if time.monotonic() >= deadline:
+            raise
+        metrics.increment("predict_flight_retried")
+        return await predictions_in_flight.run((lane, key), lambda: classify(data, deadline, lane))
 
 # Prediction endpoint with confidence percentages for each class
 @app.post("/predict/")
-async def predict(file: UploadFile = File(...)):
-    # Open the image
-    image = Image.open(file.file).convert("RGB")
-    image = transform(image).unsqueeze(0)
-
-    # Perform inference
-    with torch.no_grad():
-        outputs = model(image)
-        
-        # Apply softmax to get probabilities for each class
-        probabilities = F.softmax(outputs, dim=1)
-        
-        # Get the class with the highest probability
-        _, predicted = torch.max(probabilities, 1)
-        
-        # Prepare the prediction
-        prediction = class_names[predicted.item()]
-        
-        # Convert probabilities to a dictionary for each class with its percentage
-        class_probabilities = {class_names[i]: round(probabilities[0][i].item() * 100, 2) for i in range(len(class_names))}
-        
-    return {"prediction": prediction, "confidence_percentages": class_probabilities}
+async def predict(request: Request, file: UploadFile = File(...)):
+    require_model()
+
+    started = time.monotonic()
+    deadline = request_deadline(request)
+    lane = request_lane(request)
+    data = await file.read()
+    key = hashlib.sha256(data).digest()
+    try:
+        predicted, percentages, stage = await unless_disconnected(
+            request, classify_shared(data, key, deadline, lane)
+        )
+    except DeadlineExceeded as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
+    latency = time.monotonic() - started
+    metrics.observe("predict_" + lane, latency)
+    if audit_log is not None:
+        audit_log.record(key, loader.model_version, class_names[predicted], percentages, latency,
+                         lane=lane, stage=stage)
+
+    return encode_prediction(predicted, percentages, request.headers.get("accept", ""), stage)
+
+# Asynchronous scoring jobs (JOBS_DB: SQLite file). Items run through the same
+# scheduler as /predict/, in JOBS_LANE, with JOB_ITEM_TIMEOUT seconds per item.
+JOB_ITEM_TIMEOUT = float(os.environ.get("JOB_ITEM_TIMEOUT", "3600"))
+MAX_JOB_WAIT = 30.0
+MAX_RESULTS_PAGE = 1000
+# Per-job upload limits (the multipart parser itself accepts at most 1000 files)
+JOB_MAX_FILES = env_int("JOB_MAX_FILES") or 1000
+JOB_MAX_FILE_BYTES = (env_int("JOB_MAX_FILE_MB") or 10) * 2 ** 20
+JOB_MAX_BYTES = (env_int("JOB_MAX_MB") or 1024) * 2 ** 20
+
+async def wait_for_model():
+    while not loader.ready.is_set():
+        await asyncio.sleep(0.5)
+
+async def classify_job_item(data: bytes) -> dict:
+    lane = os.environ.get("JOBS_LANE", "bulk")
+    if lane not in scheduler.lanes:
+        lane = scheduler.default_lane
+    started = time.monotonic()
+    predicted, percentages, stage = await classify(data, started + JOB_ITEM_TIMEOUT, lane)
+    if audit_log is not None:
+        audit_log.record(hashlib.sha256(data).digest(), loader.model_version, class_names[predicted],
+                         percentages, time.monotonic() - started, lane=lane, stage=stage, source="job")
+    result = {
+        "prediction": class_names[predicted],
+        "confidence_percentages": dict(zip(class_names, percentages.tolist())),
+    }
+    if stage:
+        result["stage"] = stage
+    return result
+
+# JSON-able description of a failure outside a plain HTTP response (jobs, streams)
+def error_detail(exc: Exception):
+    if isinstance(exc, HTTPException):
+        return exc.detail
+    if isinstance(exc, DeadlineExceeded):
+        return str(exc)
+    return repr(exc)
+
+# A chunk finishes within JOB_ITEM_TIMEOUT of being claimed, so leases outlive it
+job_queue = JobQueue(os.environ.get("JOBS_DB", "jobs.db"), classify_job_item, error_detail, ready=wait_for_model,
+                     lease=JOB_ITEM_TIMEOUT + 60)
+
+# Submit a batch of images; returns a job ID to poll
+@app.post("/jobs/", status_code=202)
+async def submit_job(files: List[UploadFile] = File(...)):
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    if len(files) > JOB_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {JOB_MAX_FILES} files per job")
+
+    # Files are read (from the parser's spooled temporary files) one at a time
+    async def uploads():
+        received = 0
+        for file in files:
+            data = await file.read(JOB_MAX_FILE_BYTES + 1)
+            await file.close()
+            if len(data) > JOB_MAX_FILE_BYTES:
+                raise HTTPException(status_code=413,
+                                    detail=f"{file.filename} exceeds {JOB_MAX_FILE_BYTES // 2 ** 20} MB")
+            received += len(data)
+            if received > JOB_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Job exceeds {JOB_MAX_BYTES // 2 ** 20} MB")
+            yield file.filename, data
+
+    job_id, total = await job_queue.submit(uploads())
+    return {"job_id": job_id, "total": total}
+
+# Job progress; `wait` long-polls for up to that many seconds for new progress
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    status = await job_queue.poll(job_id, min(max(wait, 0), MAX_JOB_WAIT))
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+# One page of results in submission order, up to the first unfinished item;
+# `next_offset` is where to continue (null once every item has been returned)
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 100):
+    status = await run_in_threadpool(job_queue.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    limit = min(max(limit, 1), MAX_RESULTS_PAGE)
+    results, next_offset = await run_in_threadpool(job_queue.results, job_id, max(offset, 0), limit)
+    if next_offset is not None and next_offset >= status["total"]:
+        next_offset = None
+    return {"job_id": job_id, "status": status["status"], "results": results, "next_offset": next_offset}
+
+# Heatmap for one explanation: heatmap=grid gives a size x size grid of 0-255 values
+# (7x7 is the native layer4 resolution), heatmap=png a base64 PNG overlay on the input
+def render_heatmap(cam, image: Image.Image, heatmap: str, size: int) -> dict:
+    # explain imports torch, which must stay out of startup (see loader)
+    from .explain import heatmap_grid, overlay_png
+
+    if heatmap == "png":
+        return {"overlay_png": overlay_png(cam, image.resize((224, 224), Image.BILINEAR))}
+    return {"heatmap": heatmap_grid(cam, size)}
+
+# Prediction plus a class activation map for the predicted class. The CAM comes from
+# the same forward pass as the probabilities (no backward pass), queued through the
+# scheduler like /predict/: same lane weighting and deadline, same single inference
+# thread, batched with other explanations but never with plain predictions, and
+# always on the full model (the cascade does not apply).
+@app.post("/explain/")
+async def explain(request: Request, file: UploadFile = File(...), heatmap: str = "grid", size: int = 7):
+    require_model()
+    if loader.explainer is None:
+        raise HTTPException(status_code=501, detail="Explanations need a ResNet model with a linear fc head")
+    if heatmap not in ("grid", "png"):
+        raise HTTPException(status_code=400, detail="heatmap must be 'grid' or 'png'")
+
+    started = time.monotonic()
+    deadline = request_deadline(request)
+    lane = request_lane(request)
+    data = await file.read()
+    try:
+        async with scheduler.slot(lane):
+            check_deadline(deadline, "decode")
+            image = await run_in_threadpool(decode, data)
+            tensor = await run_in_threadpool(loader.transform, image)
+            probabilities, predicted, cam = await unless_disconnected(
+                request, scheduler.submit(tensor, deadline, lane, infer=loader.explain_images)
+            )
+    except DeadlineExceeded as exc:
+        raise HTTPException(status_code=504, detail=str(exc))
+    percentages = to_percentages(probabilities)
+    result = {
+        "prediction": class_names[predicted],
+        "confidence_percentages": dict(zip(class_names, percentages.tolist())),
+        **await run_in_threadpool(render_heatmap, cam, image, heatmap, min(max(size, 1), 224)),
+    }
+    metrics.increment("explanations")
+    if audit_log is not None:
+        audit_log.record(hashlib.sha256(data).digest(), loader.model_version, class_names[predicted], percentages,
+                         time.monotonic() - started, lane=lane, stage=None, source="explain")
+    return result
+
+# Live camera classification: binary JPEG frames in, smoothed predictions out.
+# `smoothing` is the weight of the newest frame (1 = no smoothing); frames older
+# than STREAM_FRAME_TIMEOUT seconds in the inference queue are skipped.
+STREAM_FRAME_TIMEOUT = float(os.environ.get("STREAM_FRAME_TIMEOUT", "2"))
+
+@app.websocket("/stream")
+async def stream(websocket: WebSocket, smoothing: float = 0.5):
+    await websocket.accept()
+    if not loader.ready.is_set():
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
+    try:
+        lane = request_lane(websocket)
+    except HTTPException as exc:
+        await websocket.close(code=1008, reason=str(exc.detail))
+        return
+
+    async def infer(image):
+        return await scheduler.submit(image, time.monotonic() + STREAM_FRAME_TIMEOUT, lane)
+
+    # Audits the smoothed prediction sent for each frame
+    def audit(frame, prediction, percentages, latency, stage, seq):
+        if audit_log is not None:
+            audit_log.record(hashlib.sha256(frame).digest(), loader.model_version, prediction, percentages,
+                             latency, lane=lane, stage=stage, source="stream", frame=seq)
+
+    metrics.increment("stream_connections")
+    connection = FrameStream(websocket, class_names, prepare, infer, error_detail, audit, smoothing)
+    await connection.run()
+
+# Liveness: the process is up and serving HTTP, and the model load has not failed
+# (a failed load never recovers, so the instance must be replaced)
+@app.get("/healthz")
+async def healthz():
+    if loader.load_error:
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {loader.load_error}")
+    return {"status": "ok"}
+
+# Readiness: the model is loaded and predictions can be served
+@app.get("/readyz")
+async def readyz():
+    require_model()
+    return {"status": "ready"}
+
+# Counters collected across the serving path
+@app.get("/metrics")
+async def get_metrics():
+    snapshot = metrics.snapshot()
+    cascaded = snapshot.get("cascade_fast", 0) + snapshot.get("cascade_escalated", 0)
+    if cascaded:
+        snapshot["cascade_escalation_rate"] = round(snapshot.get("cascade_escalated", 0) / cascaded, 4)
+    return snapshot
+
+# Diagnostics: the inference configuration chosen at startup
+@app.get("/diagnostics")
+async def diagnostics():
+    return {
+        "tuning": loader.tuning,
+        "startup": loader.timings,
+        "cascade": loader.cascade.describe() if loader.cascade else None,
+        "load_error": loader.load_error,
+    }
@@ -0,0 +1,52 @@
+import threading
+from collections import Counter, deque
+
+# Process-wide counters and latency samples, reported by GET /metrics
+
+# Latency percentiles are computed over the most recent samples per series
+LATENCY_WINDOW = 2048
+
+_lock = threading.Lock()
+counters = Counter()
+latencies = {}
+
+
+def increment(name: str, amount: int = 1):
+    with _lock:
+        counters[name] += amount
+
+
+# Record one latency sample in seconds
+def observe(name: str, seconds: float):
+    with _lock:
+        samples = latencies.get(name)
+        if samples is None:
+            samples = latencies[name] = deque(maxlen=LATENCY_WINDOW)
+        samples.append(seconds)
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+# count and p50/p95/p99 in milliseconds for every latency series
+def latency_summary() -> dict:
+    with _lock:
+        series = {name: sorted(samples) for name, samples in latencies.items()}
+    return {
+        name: {
+            "count": len(ordered),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        }
+        for name, ordered in series.items() if ordered
+    }
+
+
+def snapshot() -> dict:
+    with _lock:
+        result = dict(counters)
+    result["latency"] = latency_summary()
+    return result
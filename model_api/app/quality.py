@@ -0,0 +1,96 @@
+import os
+import numpy as np
+from PIL import Image
+
+# Cheap pre-inference quality gate.
+# Blurry, badly exposed, tiny or non-skin uploads are rejected before the
+# ResNet18 forward pass. All checks run on a small grayscale/YCbCr copy of the
+# image, so the gate itself costs a fraction of a millisecond.
+
+# Size of the long side of the downscaled copy used by the checks
+GATE_SIZE = 128
+
+# Thresholds (environment overrides use the upper-cased key, e.g. QUALITY_MIN_SIDE)
+thresholds = {
+    "min_side": 64,            # px, shortest side of the original upload
+    "max_aspect_ratio": 4.0,   # long side / short side
+    "min_sharpness": 10.0,     # variance of the Laplacian on the downscaled copy
+    "min_brightness": 25.0,    # mean luminance, 0-255
+    "max_brightness": 235.0,
+    "max_clipped_fraction": 0.6,  # share of pixels that are near-black or near-white
+    "min_skin_fraction": 0.05,    # share of pixels inside the YCbCr skin-tone range
+}
+for key, default in thresholds.items():
+    override = os.environ.get("QUALITY_" + key.upper())
+    if override:
+        thresholds[key] = float(override)
+
+
+# Shrink the image for the checks (box-reduces first, so large uploads stay cheap)
+def downscale(image: Image.Image) -> Image.Image:
+    scale = GATE_SIZE / max(image.size)
+    if scale >= 1:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+
+
+# Variance of the 4-neighbour Laplacian: low values mean little edge detail (blur)
+def laplacian_variance(gray: np.ndarray) -> float:
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    laplacian = (
+        4 * gray[1:-1, 1:-1]
+        - gray[:-2, 1:-1] - gray[2:, 1:-1]
+        - gray[1:-1, :-2] - gray[1:-1, 2:]
+    )
+    return float(laplacian.var())
+
+
+# Share of pixels in the classic YCbCr skin-tone box
+def skin_fraction(ycbcr: np.ndarray) -> float:
+    cb = ycbcr[..., 1]
+    cr = ycbcr[..., 2]
+    mask = (cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+    return float(mask.mean())
+
+
+def failure(check: str, value: float, threshold: float) -> dict:
+    return {"check": check, "value": round(value, 3), "threshold": threshold}
+
+
+# Run every check on an RGB image; returns the list of failed checks (empty = usable)
+def check_image(image: Image.Image) -> list:
+    failures = []
+
+    width, height = image.size
+    short_side, long_side = min(width, height), max(width, height)
+    if short_side < thresholds["min_side"]:
+        failures.append(failure("resolution", short_side, thresholds["min_side"]))
+    aspect = long_side / max(1, short_side)
+    if aspect > thresholds["max_aspect_ratio"]:
+        failures.append(failure("aspect_ratio", aspect, thresholds["max_aspect_ratio"]))
+
+    small = downscale(image)
+    ycbcr = np.asarray(small.convert("YCbCr"), dtype=np.float32)
+    luma = ycbcr[..., 0]
+
+    sharpness = laplacian_variance(luma)
+    if sharpness < thresholds["min_sharpness"]:
+        failures.append(failure("blur", sharpness, thresholds["min_sharpness"]))
+
+    brightness = float(luma.mean())
+    if brightness < thresholds["min_brightness"]:
+        failures.append(failure("underexposed", brightness, thresholds["min_brightness"]))
+    elif brightness > thresholds["max_brightness"]:
+        failures.append(failure("overexposed", brightness, thresholds["max_brightness"]))
+
+    clipped = float(((luma < 10) | (luma > 245)).mean())
+    if clipped > thresholds["max_clipped_fraction"]:
+        failures.append(failure("clipped_exposure", clipped, thresholds["max_clipped_fraction"]))
+
+    skin = skin_fraction(ycbcr)
+    if skin < thresholds["min_skin_fraction"]:
+        failures.append(failure("no_skin_detected", skin, thresholds["min_skin_fraction"]))
+
+    return failures
@@ -0,0 +1,180 @@
+import asyncio
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics
+
+# Deadline-aware batching scheduler for model inference.
+# Each priority lane (e.g. interactive web scans vs bulk scoring) has its own heap
+# ordered by deadline. Every batch is assembled afresh by weighted round-robin over
+# the lanes with queued work, so interactive requests overtake queued bulk work at
+# the next batch boundary while bulk still gets its weighted share. Jobs whose
+# deadline has passed or whose caller has gone away (future cancelled) are dropped
+# before spending a forward pass on them. A job may name its own inference callable
+# (e.g. explanations); such jobs are batched only with jobs using the same one, and
+# every batch runs on the same single inference thread.
+#
+# Counters (GET /metrics):
+#   saved_*   work skipped because nobody would read the result
+#   wasted_*  work finished after the caller's deadline or disconnect
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+# Raise DeadlineExceeded (and count the saved work) if the deadline is already gone
+def check_deadline(deadline: float, stage: str):
+    if time.monotonic() >= deadline:
+        metrics.increment("saved_expired_before_" + stage)
+        raise DeadlineExceeded(f"Deadline passed before {stage}")
+
+
+class Job:
+    def __init__(self, item, deadline: float, future: asyncio.Future, infer=None):
+        self.item = item
+        self.deadline = deadline
+        self.future = future
+        self.infer = infer
+        self.queued_at = time.monotonic()
+
+
+# Stand-in for a lane semaphore when the lane has no concurrency limit
+class Unlimited:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class Lane:
+    # weight: share of batch slots when several lanes have queued work
+    # concurrency: max requests of this lane being prepared or queued at once (0 = unlimited)
+    def __init__(self, name: str, weight: int = 1, concurrency: int = 0):
+        self.name = name
+        self.weight = max(1, weight)
+        self.concurrency = concurrency
+        self.queue = []
+        self.credit = 0
+        self.slots = None
+
+
+class DeadlineScheduler:
+    # infer: callable taking a list of items and returning one result row per item
+    # max_batch_size: int, or a callable returning one (read per batch)
+    # lanes: Lane objects; the first one is the default
+    def __init__(self, infer, max_batch_size=1, lanes=None):
+        self.infer = infer
+        self.max_batch_size = max_batch_size
+        self.lanes = {lane.name: lane for lane in (lanes or [Lane("default")])}
+        self.default_lane = next(iter(self.lanes))
+        self.sequence = itertools.count()
+        # A single inference thread: batches run one at a time on the tuned thread pool
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self.wakeup = None
+        self.worker = None
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        for lane in self.lanes.values():
+            if lane.concurrency > 0:
+                lane.slots = asyncio.Semaphore(lane.concurrency)
+        self.worker = asyncio.ensure_future(self.run())
+
+    def batch_limit(self) -> int:
+        limit = self.max_batch_size() if callable(self.max_batch_size) else self.max_batch_size
+        return max(1, limit or 1)
+
+    def queued(self) -> int:
+        return sum(len(lane.queue) for lane in self.lanes.values())
+
+    # Concurrency slot for a lane: `async with scheduler.slot(lane): ...`
+    def slot(self, lane: str):
+        slots = self.lanes[lane].slots
+        return slots if slots is not None else Unlimited()
+
+    # Queue one item and wait for its result row; `infer` replaces the scheduler's
+    # inference callable for this item
+    async def submit(self, item, deadline: float, lane: str = None, infer=None):
+        check_deadline(deadline, "inference")
+        lane = self.lanes[lane or self.default_lane]
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(lane.queue, (deadline, next(self.sequence), Job(item, deadline, future, infer)))
+        self.wakeup.set()
+        return await future
+
+    # Smooth weighted round-robin over the lanes that have queued work
+    def pick_lane(self):
+        active = [lane for lane in self.lanes.values() if lane.queue]
+        if not active:
+            return None
+        # idle lanes do not bank credit for a later burst
+        for lane in self.lanes.values():
+            if not lane.queue:
+                lane.credit = 0
+        for lane in active:
+            lane.credit += lane.weight
+        chosen = max(active, key=lambda lane: lane.credit)
+        chosen.credit -= sum(lane.weight for lane in active)
+        return chosen
+
+    # Pop up to one batch of live jobs, earliest deadline first within each lane.
+    # A batch ends early at a job with a different inference callable.
+    def next_batch(self) -> list:
+        batch = []
+        limit = self.batch_limit()
+        now = time.monotonic()
+        while len(batch) < limit:
+            lane = self.pick_lane()
+            if lane is None:
+                break
+            _, _, job = lane.queue[0]
+            if batch and job.infer is not batch[0].infer and not job.future.done():
+                # undo the pick: the job leads the next batch instead
+                active = [other for other in self.lanes.values() if other.queue]
+                for other in active:
+                    other.credit -= other.weight
+                lane.credit += sum(other.weight for other in active)
+                break
+            heapq.heappop(lane.queue)
+            if job.future.done():
+                metrics.increment("saved_abandoned_before_inference")
+            elif now >= job.deadline:
+                metrics.increment("saved_expired_before_inference")
+                job.future.set_exception(DeadlineExceeded("Deadline passed while queued"))
+            else:
+                metrics.observe("queue_wait_" + lane.name, now - job.queued_at)
+                batch.append(job)
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.queued():
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            batch = self.next_batch()
+            if not batch:
+                continue
+
+            metrics.increment("inference_batches")
+            metrics.increment("inference_items", len(batch))
+            try:
+                infer = batch[0].infer or self.infer
+                results = await loop.run_in_executor(self.executor, infer, [job.item for job in batch])
+            except Exception as exc:
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(exc)
+                continue
+
+            now = time.monotonic()
+            for job, result in zip(batch, results):
+                if job.future.done():
+                    metrics.increment("wasted_after_disconnect")
+                    continue
+                if now >= job.deadline:
+                    metrics.increment("wasted_after_deadline")
+                job.future.set_result(result)
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import time
+from starlette.concurrency import run_in_threadpool
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from . import metrics
+
+# Continuous camera-frame classification over one WebSocket.
+# The client sends JPEG frames as binary messages. Only the newest unprocessed
+# frame is kept: a frame that arrives while the previous one is still waiting is
+# replaced (counted as dropped), so the stream never falls behind the camera.
+# Frames go through the shared scheduler, which batches them with other
+# connections and /predict/ traffic. Probabilities are smoothed across frames
+# with an exponential moving average before each update is pushed back, and every
+# update sent is recorded through the audit callback.
+
+
+class FrameStream:
+    # prepare: sync bytes -> model input (raises on unusable frames)
+    # infer: coroutine model input -> (probabilities tensor, stage)
+    # error_detail: maps a prepare/infer exception to a JSON-able error
+    # audit: sync (frame bytes, prediction, percentages, latency, stage, frame seq) -> None
+    # smoothing: weight of the newest frame in the moving average (1 = no smoothing)
+    def __init__(self, websocket: WebSocket, class_names: list, prepare, infer, error_detail, audit,
+                 smoothing: float = 0.5):
+        self.websocket = websocket
+        self.class_names = class_names
+        self.prepare = prepare
+        self.infer = infer
+        self.error_detail = error_detail
+        self.audit = audit
+        self.smoothing = min(max(smoothing, 0.01), 1.0)
+        self.latest = None
+        self.frame_ready = asyncio.Event()
+        self.closed = False
+        self.average = None
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.started = time.monotonic()
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "fps": round(self.processed / elapsed, 2),
+        }
+
+    # Keep only the newest frame; an unprocessed older one is stale
+    async def receive(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                frame = message.get("bytes")
+                if not frame:
+                    continue
+                self.received += 1
+                metrics.increment("stream_frames_received")
+                if self.latest is not None:
+                    self.dropped += 1
+                    metrics.increment("stream_frames_dropped")
+                self.latest = (self.received, frame)
+                self.frame_ready.set()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self.closed = True
+            self.frame_ready.set()
+
+    # Send one message; a failed send means the client has gone
+    async def send(self, message: dict) -> bool:
+        if self.closed:
+            return False
+        try:
+            await self.websocket.send_text(json.dumps(message))
+        except Exception:
+            self.closed = True
+            return False
+        return True
+
+    async def process(self):
+        while True:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+            if self.closed:
+                return
+            if self.latest is None:
+                continue
+            seq, frame = self.latest
+            self.latest = None
+            started = time.monotonic()
+
+            try:
+                image = await run_in_threadpool(self.prepare, frame)
+                probabilities, stage = await self.infer(image)
+            except Exception as exc:
+                if not await self.send({"frame": seq, "error": self.error_detail(exc)}):
+                    return
+                continue
+            if self.closed:
+                return  # hung up during inference
+
+            current = probabilities.double().numpy()
+            if self.average is None:
+                self.average = current
+            else:
+                self.average = self.smoothing * current + (1 - self.smoothing) * self.average
+            self.processed += 1
+            metrics.increment("stream_frames_processed")
+
+            percentages = (self.average * 100).round(2)
+            prediction = self.class_names[int(self.average.argmax())]
+            self.audit(frame, prediction, percentages, time.monotonic() - started, stage, seq)
+            sent = await self.send({
+                "frame": seq,
+                "prediction": prediction,
+                "confidence_percentages": dict(zip(self.class_names, percentages.tolist())),
+                "stats": self.stats(),
+            })
+            if not sent:
+                return
+
+    async def run(self):
+        receiver = asyncio.ensure_future(self.receive())
+        try:
+            await self.process()
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receiver.cancel()
+        return self.stats()
@@ -0,0 +1,112 @@
+import os
+import time
+import torch
+
+# Startup auto-tuner for CPU inference threads.
+# Every uvicorn worker gets its own PyTorch thread pool, so by default N workers
+# each spawn a thread per core and oversubscribe the box. We size the pool from
+# the cgroup CPU quota and worker count, then benchmark a few configurations.
+
+
+# CPUs actually available to this container (cgroup quota, then affinity mask)
+def available_cpus() -> int:
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+# Number of worker processes sharing the CPUs (uvicorn/gunicorn convention)
+def worker_count() -> int:
+    try:
+        return max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+# Candidate thread counts: powers of two up to the per-worker budget, plus the budget itself
+def thread_candidates(budget: int):
+    candidates = {budget}
+    n = 1
+    while n < budget:
+        candidates.add(n)
+        n *= 2
+    return sorted(candidates)
+
+
+# Mean per-image latency (ms) of the model at a given batch size
+def measure(model, batch_size: int, image_size: int = 224, repeats: int = 3) -> float:
+    batch = torch.randn(batch_size, 3, image_size, image_size)
+    with torch.no_grad():
+        model(batch)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(batch)
+        elapsed = time.perf_counter() - start
+    return elapsed * 1000 / (repeats * batch_size)
+
+
+# Pick and pin the thread/batch configuration for this worker.
+# num_threads / interop_threads / batch_size override the benchmark when given.
+def autotune(model, num_threads=None, interop_threads=None, batch_size=None,
+             benchmark=True, batch_candidates=(1, 4)):
+    cpus = available_cpus()
+    workers = worker_count()
+    budget = max(1, cpus // workers)
+
+    # Inter-op parallelism does not help a single sequential ResNet forward pass;
+    # it can only be set once per process, before any parallel work has run
+    interop = interop_threads or 1
+    try:
+        torch.set_num_interop_threads(interop)
+    except RuntimeError:
+        interop = torch.get_num_interop_threads()
+
+    results = []
+    threads = num_threads or budget
+    best_batch = batch_size or 1
+    if benchmark and (num_threads is None or batch_size is None):
+        thread_options = [num_threads] if num_threads else thread_candidates(budget)
+        batch_options = [batch_size] if batch_size else list(batch_candidates)
+        best = None
+        for t in thread_options:
+            torch.set_num_threads(t)
+            for b in batch_options:
+                latency = measure(model, b)
+                results.append({"threads": t, "batch_size": b, "ms_per_image": round(latency, 3)})
+                if best is None or latency < best[0]:
+                    best = (latency, t, b)
+        _, threads, best_batch = best
+
+    torch.set_num_threads(threads)
+
+    return {
+        "available_cpus": cpus,
+        "workers": workers,
+        "per_worker_cpus": budget,
+        "num_threads": torch.get_num_threads(),
+        "interop_threads": interop,
+        "batch_size": best_batch,
+        "overridden": bool(num_threads or interop_threads or batch_size),
+        "benchmark": results,
+    }
@@ -0,0 +1,44 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Request-path cost of the prediction audit log, and offline scan speed.
+# Run from model_api/:  python benchmarks/audit_log.py --records 200000
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import metrics  # noqa: E402
+from app.audit import AuditLog, read_segments  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time AuditLog.record() and read_segments()")
+    parser.add_argument("--records", type=int, default=200000)
+    parser.add_argument("--capacity", type=int, default=10000)
+    args = parser.parse_args()
+
+    percentages = [2.14, 92.87, 1.12, 0.41, 2.83, 0.63]
+    input_hash = bytes(32)
+    with tempfile.TemporaryDirectory() as directory:
+        log = AuditLog(directory, capacity=args.capacity, flush_interval=0.05, segment_bytes=8 * 2 ** 20)
+        log.start()
+        start = time.perf_counter()
+        for _ in range(args.records):
+            log.record(input_hash, "model.pth@000000000000", "Eczema", percentages, 0.0123, lane="interactive")
+        elapsed = time.perf_counter() - start
+        log.stop()
+
+        counters = metrics.snapshot()
+        print(f"record(): {elapsed * 1e6 / args.records:.2f} us/call over {args.records} calls")
+        print(f"written {counters.get('audit_written', 0)}, dropped {counters.get('audit_dropped', 0)}")
+
+        start = time.perf_counter()
+        scanned = sum(1 for _ in read_segments(directory))
+        elapsed = time.perf_counter() - start
+        print(f"read_segments(): {scanned} records in {elapsed:.2f} sec "
+              f"({scanned / max(elapsed, 1e-9):,.0f} records/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+
+import torch
+from PIL import Image
+
+# Overhead of CAM explanations versus the plain prediction path.
+# Uses randomly initialised weights unless --model is given, so it runs offline.
+# Run from model_api/:  python benchmarks/explain.py --threads 2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.loader import build_model, load_model  # noqa: E402
+from app.explain import CamExplainer, heatmap_grid, overlay_png  # noqa: E402
+
+
+def timed(fn, repeats: int) -> float:
+    for _ in range(3):
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare plain prediction with CAM explanation")
+    parser.add_argument("--model", default=None, help="Checkpoint (default: random ResNet18)")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    model = load_model(args.model) if args.model else build_model().eval()
+    explainer = CamExplainer(model)
+    batch = torch.randn(1, 3, 224, 224)
+    image = Image.new("RGB", (224, 224), (190, 140, 120))
+
+    def plain():
+        with torch.no_grad():
+            torch.softmax(model(batch), dim=1)
+
+    def cam():
+        probabilities, features = explainer.forward(batch)
+        return explainer.cams(features, [int(probabilities[0].argmax())])[0]
+
+    heat = cam()
+    results = {
+        "plain prediction": timed(plain, args.repeats),
+        "prediction + CAM": timed(cam, args.repeats),
+        "prediction + CAM + grid": timed(lambda: heatmap_grid(cam(), 7), args.repeats),
+        "prediction + CAM + PNG overlay": timed(lambda: overlay_png(cam(), image), args.repeats),
+        "PNG overlay only": timed(lambda: overlay_png(heat, image), args.repeats),
+    }
+    base = results["plain prediction"]
+    for name, ms in results.items():
+        print(f"{name:>32}: {ms:8.2f} ms  ({(ms - base) / base * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+# Interactive vs bulk latency under mixed load, with and without priority lanes.
+# The model is simulated by a fixed per-batch + per-image cost, so this runs
+# without weights. Run from model_api/:  python benchmarks/priority_lanes.py
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.scheduler import DeadlineScheduler, Lane  # noqa: E402
+
+
+def fake_infer(batch_ms: float, image_ms: float):
+    def infer(items):
+        time.sleep((batch_ms + image_ms * len(items)) / 1000)
+        return items
+    return infer
+
+
+async def timed(scheduler, lane, submit_lane, results):
+    start = time.perf_counter()
+    await scheduler.submit(None, time.monotonic() + 3600, submit_lane)
+    results[lane].append(time.perf_counter() - start)
+
+
+async def scenario(use_lanes: bool, args):
+    lanes = [Lane("interactive", weight=args.weight), Lane("bulk", weight=1)] if use_lanes else [Lane("shared")]
+    scheduler = DeadlineScheduler(fake_infer(args.batch_ms, args.image_ms), args.batch_size, lanes)
+    scheduler.start()
+    results = {"interactive": [], "bulk": []}
+    submit = (lambda lane: lane) if use_lanes else (lambda lane: "shared")
+
+    # a bulk burst lands first, then interactive scans trickle in behind it
+    tasks = [asyncio.ensure_future(timed(scheduler, "bulk", submit("bulk"), results))
+             for _ in range(args.bulk)]
+    rng = random.Random(0)
+    for _ in range(args.interactive):
+        await asyncio.sleep(rng.expovariate(1000 / args.interval_ms))
+        tasks.append(asyncio.ensure_future(timed(scheduler, "interactive", submit("interactive"), results)))
+    await asyncio.gather(*tasks)
+    scheduler.worker.cancel()
+    return results
+
+
+def report(label, results):
+    for lane, samples in results.items():
+        ordered = sorted(samples)
+        p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+        print(f"{label:>10} {lane:>11}: n={len(ordered):4d} "
+              f"p50={statistics.median(ordered) * 1000:8.1f} ms  p99={p99 * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate mixed interactive/bulk load")
+    parser.add_argument("--bulk", type=int, default=400)
+    parser.add_argument("--interactive", type=int, default=50)
+    parser.add_argument("--interval-ms", type=float, default=40.0)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--batch-ms", type=float, default=5.0)
+    parser.add_argument("--image-ms", type=float, default=8.0)
+    parser.add_argument("--weight", type=int, default=4, help="Interactive lane weight (bulk = 1)")
+    args = parser.parse_args()
+
+    report("no lanes", asyncio.run(scenario(False, args)))
+    report("lanes", asyncio.run(scenario(True, args)))
+
+
+if __name__ == "__main__":
+    main()
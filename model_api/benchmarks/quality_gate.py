@@ -0,0 +1,37 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+# Cost of the pre-inference quality gate per image.
+# Run from model_api/:  python benchmarks/quality_gate.py --size 1024 768
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.quality import check_image  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the quality gate on synthetic images")
+    parser.add_argument("--size", type=int, nargs=2, default=(1024, 768), metavar=("W", "H"))
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(args.size[1], args.size[0], 3), dtype=np.uint8)
+    image = Image.fromarray(pixels, "RGB")
+    small = image.resize((128, 96))
+
+    for label, target in (("full upload", image), ("pre-downscaled", small)):
+        check_image(target)  # warm-up
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            check_image(target)
+        elapsed = (time.perf_counter() - start) * 1000 / args.iterations
+        print(f"{label:>15} {target.size[0]}x{target.size[1]}: {elapsed:.3f} ms/image")
+
+
+if __name__ == "__main__":
+    main()
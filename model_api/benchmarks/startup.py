@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+# Reproducible startup benchmark for the model API.
+# Run from model_api/:  python benchmarks/startup.py --runs 5
+# Measures, per fresh process:
+#   import_s  - `import app.main` in a clean interpreter
+#   live_s    - process spawn until /healthz answers (port bound)
+#   ready_s   - process spawn until /readyz answers 200 (model loaded)
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=API_DIR, check=True,
+                         capture_output=True, text=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(url: str, start: float, timeout: float):
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def time_server(timeout: float, env: dict):
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        live = wait_for(f"http://127.0.0.1:{port}/healthz", start, timeout)
+        ready = wait_for(f"http://127.0.0.1:{port}/readyz", start, timeout)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return live, ready
+
+
+def summarize(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {"median": round(statistics.median(values), 3), "min": round(min(values), 3),
+            "max": round(max(values), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import, liveness and readiness times")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-autotune", action="store_true", help="Set AUTOTUNE=0 in the server")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.no_autotune:
+        env["AUTOTUNE"] = "0"
+
+    imports, lives, readies = [], [], []
+    for _ in range(args.runs):
+        imports.append(time_import())
+        live, ready = time_server(args.timeout, env)
+        lives.append(live)
+        readies.append(ready)
+
+    print(json.dumps({
+        "runs": args.runs,
+        "import_s": summarize(imports),
+        "live_s": summarize(lives),
+        "ready_s": summarize(readies),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import calendar
+import json
+import os
+import time
+
+from app.audit import AuditLog, read_segments
+
+T0 = calendar.timegm((2026, 5, 1, 12, 0, 0))
+
+
+def write_segment(directory: str, start: float, owner: str, timestamps: list):
+    name = time.strftime("audit-%Y%m%dT%H%M%S", time.gmtime(start)) + f"-000000000-{owner}.jsonl"
+    with open(os.path.join(directory, name), "w") as f:
+        for ts in timestamps:
+            f.write(json.dumps({"ts": ts, "prediction": "Acne"}) + "\n")
+
+
+def test_since_keeps_records_of_a_segment_overlapping_another_owner(tmp_path):
+    # A opened its segment first but wrote after B opened one
+    write_segment(tmp_path, T0, "aaaa", [T0 + 1, T0 + 20, T0 + 30])
+    write_segment(tmp_path, T0 + 5, "bbbb", [T0 + 6, T0 + 25])
+    assert sorted(r["ts"] for r in read_segments(tmp_path, since=T0 + 10)) == [T0 + 20, T0 + 25, T0 + 30]
+
+
+def test_since_skips_segments_superseded_by_the_same_owner(tmp_path):
+    write_segment(tmp_path, T0, "aaaa", [T0 + 1, T0 + 2])
+    write_segment(tmp_path, T0 + 60, "aaaa", [T0 + 61, T0 + 90])
+    # the older segment must be skipped by name, without being opened
+    with open(os.path.join(tmp_path, sorted(os.listdir(tmp_path))[0]), "w") as f:
+        f.write("not json\n")
+    assert [r["ts"] for r in read_segments(tmp_path, since=T0 + 70)] == [T0 + 90]
+
+
+def test_workers_sharing_a_directory_keep_each_others_segments(tmp_path):
+    first = AuditLog(str(tmp_path), flush_interval=0.01)
+    first.start()
+    first.record(b"\x01" * 32, "v1", "Acne", [1.0], 0.01)
+    first.flush()
+
+    second = AuditLog(str(tmp_path), flush_interval=0.01)
+    second.start()  # must not compress or remove the first worker's live segment
+    first.record(b"\x02" * 32, "v1", "Eczema", [2.0], 0.01)
+    second.record(b"\x03" * 32, "v1", "Warts", [3.0], 0.01)
+    first.stop()
+    second.stop()
+
+    assert sorted(r["prediction"] for r in read_segments(tmp_path)) == ["Acne", "Eczema", "Warts"]
+    assert all(name.endswith(".jsonl.gz") for name in os.listdir(tmp_path))
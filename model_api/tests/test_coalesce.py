@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from app.coalesce import SingleFlight
+
+
+def test_concurrent_callers_share_one_computation():
+    async def scenario():
+        flights = SingleFlight("test")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flights.run("key", compute) for _ in range(5)))
+        return results, calls, flights.in_flight
+
+    results, calls, in_flight = asyncio.run(scenario())
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert in_flight == {}
+
+
+def test_one_waiter_leaving_does_not_cancel_the_others():
+    async def scenario():
+        flights = SingleFlight("test")
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.ensure_future(flights.run("key", compute))
+        second = asyncio.ensure_future(flights.run("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ("result", True)
+
+
+def test_last_waiter_leaving_cancels_the_computation():
+    async def scenario():
+        flights = SingleFlight("test")
+        cancelled = asyncio.Event()
+
+        async def compute():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiter = asyncio.ensure_future(flights.run("key", compute))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        return flights.in_flight
+
+    assert asyncio.run(scenario()) == {}
+
+
+def test_request_arriving_while_a_flight_is_cancelling_starts_a_fresh_one():
+    async def scenario():
+        flights = SingleFlight("test")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                await asyncio.sleep(0.02)  # slow to unwind
+                raise
+            return "result"
+
+        abandoned = asyncio.ensure_future(flights.run("key", compute))
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        await asyncio.sleep(0)
+        result = await flights.run("key", compute)
+        await asyncio.sleep(0.05)
+        return result, len(calls), flights.in_flight
+
+    assert asyncio.run(scenario()) == ("result", 2, {})
+
+
+def test_failed_flight_is_not_reused():
+    async def scenario():
+        flights = SingleFlight("test")
+        outcomes = iter([ValueError("first"), "second"])
+
+        async def compute():
+            await asyncio.sleep(0)
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with pytest.raises(ValueError):
+            await flights.run("key", compute)
+        return await flights.run("key", compute)
+
+    assert asyncio.run(scenario()) == "second"
+
+
+def test_follower_with_a_later_deadline_retries_after_the_leader_expires(monkeypatch):
+    pytest.importorskip("fastapi")
+    import time
+    from app import main
+    from app.scheduler import DeadlineExceeded
+
+    async def classify(data, deadline, lane):
+        await asyncio.sleep(0.02)
+        if time.monotonic() >= deadline:
+            raise DeadlineExceeded("Deadline passed while queued")
+        return 1, deadline, None
+
+    monkeypatch.setattr(main, "classify", classify)
+
+    async def scenario():
+        now = time.monotonic()
+        leader = asyncio.ensure_future(main.classify_shared(b"img", b"key", now + 0.01, "interactive"))
+        follower = asyncio.ensure_future(main.classify_shared(b"img", b"key", now + 5, "interactive"))
+        return await asyncio.gather(leader, follower, return_exceptions=True), now
+
+    (leader, follower), now = asyncio.run(scenario())
+    assert isinstance(leader, DeadlineExceeded)
+    assert follower[1] == pytest.approx(now + 5)
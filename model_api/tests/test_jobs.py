@@ -0,0 +1,136 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from app import jobs  # noqa: E402
+from app.jobs import DONE, JobQueue  # noqa: E402
+
+
+async def classify(data: bytes) -> dict:
+    return {"prediction": data.decode()}
+
+
+async def uploads(count: int, fail_at: int = None):
+    for seq in range(count):
+        if seq == fail_at:
+            raise RuntimeError("client went away")
+        yield f"{seq}.jpg", f"image-{seq}".encode()
+
+
+# A queue on `path` whose worker is stopped, so tests drive claim/record directly
+# (must be called inside a running event loop)
+def open_queue(path: str, owner: str = None, chunk_size: int = 2) -> JobQueue:
+    queue = JobQueue(path, classify, repr, chunk_size=chunk_size)
+    if owner is not None:
+        queue.owner = owner
+    queue.start()
+    queue.worker.cancel()
+    return queue
+
+
+async def run_chunk(queue: JobQueue, chunk: list):
+    queue.record(await asyncio.gather(*(queue.process(*row) for row in chunk)))
+
+
+# Owner ID of a live process on this host that is not the test process
+def other_live_owner(token: str) -> str:
+    return f"{jobs.worker_id().rsplit(':', 2)[0]}:1:{token}"
+
+
+def test_results_stop_at_the_first_unfinished_item(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "jobs.db")
+        worker_a = open_queue(path, owner=other_live_owner("aaaa"))
+        worker_b = open_queue(path, owner=other_live_owner("bbbb"))
+        job_id, total = await worker_a.submit(uploads(4))
+        assert total == 4
+
+        chunk_a = worker_a.claim()
+        chunk_b = worker_b.claim()
+        assert [row[1] for row in chunk_a] == [0, 1]
+        assert [row[1] for row in chunk_b] == [2, 3]
+
+        # B finishes first: nothing is returned past the unfinished items 0-1
+        await run_chunk(worker_b, chunk_b)
+        assert worker_a.results(job_id, 0, 100) == ([], 0)
+
+        await run_chunk(worker_a, chunk_a)
+        page, next_offset = worker_a.results(job_id, 0, 3)
+        assert [item["index"] for item in page] == [0, 1, 2]
+        assert next_offset == 3
+        page, next_offset = worker_a.results(job_id, next_offset, 3)
+        assert [item["index"] for item in page] == [3]
+        assert next_offset is None
+        status = worker_a.status(job_id)
+        assert (status["status"], status["done"]) == (DONE, 4)
+
+    asyncio.run(scenario())
+
+
+def test_job_is_not_claimable_until_its_upload_completes(tmp_path):
+    async def scenario():
+        queue = open_queue(str(tmp_path / "jobs.db"))
+        claims = []
+
+        async def slow_uploads():
+            async for upload in uploads(3):
+                yield upload
+                claims.append(queue.claim())
+
+        await queue.submit(slow_uploads())
+        assert claims == [[], [], []]
+        assert len(queue.claim()) == 2
+
+    asyncio.run(scenario())
+
+
+def test_interrupted_upload_leaves_no_job(tmp_path):
+    async def scenario():
+        queue = open_queue(str(tmp_path / "jobs.db"))
+        with pytest.raises(RuntimeError):
+            await queue.submit(uploads(5, fail_at=3))
+        assert queue.execute("SELECT COUNT(*) FROM jobs") == [(0,)]
+        assert queue.execute("SELECT COUNT(*) FROM items") == [(0,)]
+
+    asyncio.run(scenario())
+
+
+def test_starting_worker_leaves_live_leases_alone(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "jobs.db")
+        running = open_queue(path, owner=other_live_owner("aaaa"))
+        job_id, _ = await running.submit(uploads(2))
+        chunk = running.claim()
+
+        starting = open_queue(path)
+        assert starting.claim() == []
+        await run_chunk(running, chunk)
+        assert running.status(job_id)["done"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_items_of_a_dead_worker_are_requeued_and_counted_once(tmp_path):
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+
+    async def scenario():
+        path = str(tmp_path / "jobs.db")
+        dead = open_queue(path, owner=f"{jobs.worker_id().rsplit(':', 2)[0]}:{pid}:dead")
+        job_id, _ = await dead.submit(uploads(2))
+        lost = dead.claim()
+
+        survivor = open_queue(path)
+        chunk = survivor.claim()
+        assert [row[1] for row in chunk] == [0, 1]
+        await run_chunk(survivor, chunk)
+        # the dead worker's late checkpoint is ignored rather than counted twice
+        await run_chunk(dead, lost)
+        assert survivor.status(job_id)["done"] == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.scheduler import DeadlineExceeded, DeadlineScheduler, Lane, check_deadline
+
+
+# Inference stand-in that records every batch it is given
+class Recorder:
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.delay = delay
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        time.sleep(self.delay)
+        return [item * 10 for item in items]
+
+
+def later(seconds: float) -> float:
+    return time.monotonic() + seconds
+
+
+def test_check_deadline_raises_once_passed():
+    check_deadline(later(1), "decode")
+    with pytest.raises(DeadlineExceeded):
+        check_deadline(time.monotonic() - 0.001, "decode")
+
+
+def test_results_return_to_their_callers_in_batches():
+    async def scenario():
+        infer = Recorder()
+        scheduler = DeadlineScheduler(infer, max_batch_size=4)
+        scheduler.start()
+        results = await asyncio.gather(*(scheduler.submit(i, later(5)) for i in range(6)))
+        return results, infer.batches
+
+    results, batches = asyncio.run(scenario())
+    assert results == [i * 10 for i in range(6)]
+    assert max(len(batch) for batch in batches) <= 4
+
+
+def test_queued_jobs_run_earliest_deadline_first():
+    scheduler = DeadlineScheduler(Recorder(), max_batch_size=3)
+
+    async def scenario():
+        scheduler.wakeup = asyncio.Event()
+        for item, deadline in ((1, 5.0), (2, 1.0), (3, 3.0)):
+            asyncio.ensure_future(scheduler.submit(item, later(deadline)))
+        await asyncio.sleep(0)
+        return [job.item for job in scheduler.next_batch()]
+
+    assert asyncio.run(scenario()) == [2, 3, 1]
+
+
+def test_expired_and_abandoned_jobs_are_dropped_before_inference():
+    async def scenario():
+        infer = Recorder(delay=0.05)
+        scheduler = DeadlineScheduler(infer, max_batch_size=1)
+        scheduler.start()
+        blocker = asyncio.ensure_future(scheduler.submit(0, later(5)))
+        await asyncio.sleep(0.01)  # item 0 is now running
+        expiring = asyncio.ensure_future(scheduler.submit(1, later(0.02)))
+        abandoned = asyncio.ensure_future(scheduler.submit(2, later(5)))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await blocker
+        with pytest.raises(DeadlineExceeded):
+            await expiring
+        await asyncio.sleep(0.01)
+        return infer.batches
+
+    assert asyncio.run(scenario()) == [[0]]
+
+
+def test_weighted_round_robin_shares_batches_between_lanes():
+    async def scenario():
+        scheduler = DeadlineScheduler(Recorder(), max_batch_size=5,
+                                      lanes=[Lane("interactive", weight=4), Lane("bulk", weight=1)])
+        scheduler.wakeup = asyncio.Event()
+        for i in range(10):
+            asyncio.ensure_future(scheduler.submit(100 + i, later(5), "bulk"))
+            asyncio.ensure_future(scheduler.submit(i, later(5), "interactive"))
+        await asyncio.sleep(0)
+        return [job.item for job in scheduler.next_batch()]
+
+    batch = asyncio.run(scenario())
+    assert sum(1 for item in batch if item < 100) == 4
+    assert sum(1 for item in batch if item >= 100) == 1
+
+
+def test_lane_concurrency_limits_requests_in_flight():
+    async def scenario():
+        scheduler = DeadlineScheduler(Recorder(), lanes=[Lane("interactive"), Lane("bulk", concurrency=2)])
+        scheduler.start()
+        active = peak = 0
+
+        async def request():
+            nonlocal active, peak
+            async with scheduler.slot("bulk"):
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        return peak
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_inference_errors_reach_every_caller_in_the_batch():
+    def failing(items):
+        raise RuntimeError("boom")
+
+    async def scenario():
+        scheduler = DeadlineScheduler(failing, max_batch_size=4)
+        scheduler.start()
+        return await asyncio.gather(*(scheduler.submit(i, later(5)) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_jobs_with_their_own_inference_callable_are_batched_separately():
+    async def scenario():
+        plain = Recorder()
+        threads = []
+
+        def explain(items):
+            threads.append(threading.current_thread().name)
+            return [-item for item in items]
+
+        scheduler = DeadlineScheduler(plain, max_batch_size=8)
+        scheduler.start()
+        results = await asyncio.gather(
+            scheduler.submit(1, later(5)),
+            scheduler.submit(2, later(5), infer=explain),
+            scheduler.submit(3, later(5)),
+            scheduler.submit(4, later(5), infer=explain),
+        )
+        return results, plain.batches, threads
+
+    results, plain_batches, threads = asyncio.run(scenario())
+    assert results == [10, -2, 30, -4]
+    assert sorted(item for batch in plain_batches for item in batch) == [1, 3]
+    assert threads and all(name.startswith("inference") for name in threads)
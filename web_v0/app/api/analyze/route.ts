@@ -16,6 +16,17 @@ const MOCK_RESPONSE = {
   },
 }
 
+// User-facing advice for each quality-gate check the API can fail (422 detail.reasons)
+const QUALITY_MESSAGES: Record<string, string> = {
+  resolution: "The image resolution is too low.",
+  aspect_ratio: "The image is too narrow; crop it closer to the affected area.",
+  blur: "The image is blurry; hold the camera steady and retake the photo.",
+  underexposed: "The image is too dark; retake it in better light.",
+  overexposed: "The image is too bright; avoid direct flash or sunlight.",
+  clipped_exposure: "Large parts of the image are washed out or completely dark.",
+  no_skin_detected: "No skin was detected; center the affected skin area in the photo.",
+}
+
 export async function POST(request: NextRequest) {
   try {
     // 1. Get form data
@@ -52,6 +63,8 @@ export async function POST(request: NextRequest) {
       const response = await fetch("https://skin-disease-api-j0l8.onrender.com/predict/", {
         method: "POST",
         body: apiFormData,
+        // Lets the API drop the request instead of computing a result we will no longer wait for
+        headers: { "X-Request-Timeout": "25" },
         signal: controller.signal,
       })
       clearTimeout(timeout)
@@ -62,7 +75,24 @@ export async function POST(request: NextRequest) {
         let errorDetails = "API request failed"
         try {
           const errorData = await response.json()
-          errorDetails = errorData.detail || JSON.stringify(errorData)
+          const detail = errorData.detail
+
+          // Unusable photo: pass the quality-gate reasons through instead of failing opaquely
+          if (response.status === 422 && Array.isArray(detail?.reasons)) {
+            const reasons = detail.reasons.map((reason: { check: string }) => ({
+              ...reason,
+              message: QUALITY_MESSAGES[reason.check] || `Image quality check failed: ${reason.check}`,
+            }))
+            return NextResponse.json(
+              {
+                error: reasons.map((reason: { message: string }) => reason.message).join(" "),
+                reasons,
+              },
+              { status: 422 },
+            )
+          }
+
+          errorDetails = typeof detail === "string" ? detail : JSON.stringify(detail ?? errorData)
         } catch (e) {
           console.error("Error parsing error response:", e)
         }